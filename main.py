@@ -1,12 +1,44 @@
 import asyncio
 from src.db.models import init_db
-from src.bot.bot import start_bot
-from src.data.scheduler import start_scheduler
+from config.logs import setup_logging
+import config.config as config
 
 async def main():
+    setup_logging()
+
     # Автоматически создаст таблицы при первом запуске
     init_db()
-    
+
+    if config.METRICS_ENABLED:
+        from src.monitoring.metrics import start_metrics_server
+        await start_metrics_server()
+
+    if config.RUN_MODE == "worker":
+        # Воркер: только свой шард тикеров, сигналы уходят в outbox
+        from src.data.scheduler import start_scheduler
+        from src.data.sharding import start_heartbeat, release
+        try:
+            await asyncio.gather(
+                start_heartbeat(config.WORKER_ID),
+                start_scheduler()
+            )
+        finally:
+            release(config.WORKER_ID)
+        return
+
+    from src.bot.bot import start_bot
+
+    if config.RUN_MODE == "notifier":
+        # Notifier: бот + рассылка сигналов из outbox от всех воркеров
+        from src.bot.notifier import start_notifier
+        await asyncio.gather(
+            start_bot(),
+            start_notifier()
+        )
+        return
+
+    from src.data.scheduler import start_scheduler
+
     # Запуск бота и scheduler
     await asyncio.gather(
         start_bot(),
@@ -14,4 +46,4 @@ async def main():
     )
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,210 @@
+"""
+Аналитика по истории снимков на DuckDB.
+
+DuckDB читает SQLite файл напрямую (READ_ONLY, расширение sqlite) и, если есть,
+Parquet архив снимков — без ORM и без нагрузки на основной процесс записи.
+Расширение берётся из pip-пакета duckdb-extension-sqlite-scanner (версия = версии duckdb),
+поэтому сеть во время запросов не нужна.
+
+    python -m src.analytics.queries top_oi_change --days 7 --limit 20
+    python -m src.analytics.queries iv_term_structure --ticker AAPL --days 30
+"""
+import argparse
+import glob
+import os
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+import config.config as config
+
+# Снимки из живой базы + архив (колонки приводятся к одному виду)
+SNAPSHOT_COLUMNS = """
+    ticker, option_type, strike, expiration,
+    volume, open_interest, implied_volatility, last_price,
+    CAST(snapshot_time AS TIMESTAMP) AS snapshot_time
+"""
+
+# Библиотека параметризованных запросов: имя -> (SQL, параметры по порядку, описание)
+# since вычисляется из days в run_query
+QUERIES = {
+    "top_oi_change": (
+        """
+        SELECT ticker, option_type, strike, expiration,
+               arg_min(open_interest, snapshot_time) AS oi_start,
+               arg_max(open_interest, snapshot_time) AS oi_end,
+               arg_max(open_interest, snapshot_time) - arg_min(open_interest, snapshot_time) AS oi_change
+        FROM snapshots
+        WHERE snapshot_time >= ?
+        GROUP BY ALL
+        ORDER BY abs(oi_change) DESC
+        LIMIT ?
+        """,
+        ["since", "limit"],
+        "Контракты с наибольшим изменением открытого интереса за период"
+    ),
+    "iv_term_structure": (
+        """
+        SELECT date_trunc('day', snapshot_time) AS day, expiration,
+               round(avg(implied_volatility), 4) AS avg_iv,
+               count(*) AS contracts
+        FROM snapshots
+        WHERE ticker = ? AND snapshot_time >= ?
+          AND implied_volatility > 0
+        GROUP BY ALL
+        ORDER BY day, expiration
+        """,
+        ["ticker", "since"],
+        # fetch_option_chain загружает только expirations[0] — настоящей кривой по срокам здесь нет
+        "Средняя IV по дням (только ближайшая экспирация)"
+    ),
+    "volume_leaders": (
+        """
+        SELECT ticker, sum(max_volume) AS volume
+        FROM (
+            SELECT ticker, option_type, strike, expiration, date_trunc('day', snapshot_time) AS day,
+                   max(volume) AS max_volume
+            FROM snapshots
+            WHERE snapshot_time >= ?
+            GROUP BY ALL
+        )
+        GROUP BY ticker
+        ORDER BY volume DESC
+        LIMIT ?
+        """,
+        ["since", "limit"],
+        "Тикеры с наибольшим опционным объёмом за период"
+    ),
+    "pcr_history": (
+        """
+        SELECT CAST(calculated_at AS TIMESTAMP) AS calculated_at, pcr_volume, pcr_oi, signal_type
+        FROM live.put_call_ratios
+        WHERE ticker = ? AND CAST(calculated_at AS TIMESTAMP) >= ?
+        ORDER BY calculated_at
+        """,
+        ["ticker", "since"],
+        "История Put/Call Ratio тикера"
+    )
+}
+
+def _sqlite_path() -> str:
+    return config.DATABASE_URL.replace("sqlite:///", "", 1)
+
+def _sqlite_extension_path(duckdb) -> str:
+    """Расширение из пакета duckdb-extension-sqlite-scanner (ставится через pip вместе с зависимостями)"""
+    try:
+        import duckdb_extension_sqlite_scanner as package
+    except ImportError:
+        return None
+    path = os.path.join(os.path.dirname(package.__file__), "extensions", f"v{duckdb.__version__}", "sqlite_scanner.duckdb_extension")
+    return path if os.path.exists(path) else None
+
+def load_sqlite_extension(con, duckdb):
+    """
+    Расширение sqlite без обращения к сети: сначала уже установленное (DUCKDB_EXTENSION_DIR),
+    затем файл из pip-пакета; INSTALL из extensions.duckdb.org — только последний вариант
+    """
+    try:
+        con.execute("LOAD sqlite")
+        return
+    except duckdb.Error:
+        pass
+
+    path = _sqlite_extension_path(duckdb)
+    if path:
+        con.execute(f"LOAD '{path}'")
+        return
+
+    try:
+        con.execute("INSTALL sqlite")
+        con.execute("LOAD sqlite")
+    except duckdb.Error as e:
+        raise RuntimeError(
+            f"Расширение DuckDB sqlite недоступно ({e}). Установите duckdb-extension-sqlite-scanner=={duckdb.__version__} "
+            f"или выполните при деплое: python -m src.analytics.queries --install-extension"
+        )
+
+def connect():
+    """Новое in-memory соединение DuckDB с подключённой SQLite базой и архивом"""
+    try:
+        import duckdb
+    except ImportError:
+        raise RuntimeError("Для аналитики установите duckdb")
+
+    con = duckdb.connect(database=":memory:")
+    if config.DUCKDB_EXTENSION_DIR:
+        con.execute(f"SET extension_directory = '{config.DUCKDB_EXTENSION_DIR}'")
+    load_sqlite_extension(con, duckdb)
+    con.execute(f"ATTACH '{_sqlite_path()}' AS live (TYPE SQLITE, READ_ONLY)")
+
+    sources = [f"SELECT {SNAPSHOT_COLUMNS} FROM live.option_snapshots"]
+    if config.ANALYTICS_ARCHIVE_GLOB and glob.glob(config.ANALYTICS_ARCHIVE_GLOB):
+        sources.append(f"SELECT {SNAPSHOT_COLUMNS} FROM read_parquet('{config.ANALYTICS_ARCHIVE_GLOB}')")
+    con.execute("CREATE VIEW snapshots AS " + " UNION ALL ".join(sources))
+    return con
+
+def run_query(name: str, **params):
+    """Выполняет запрос из библиотеки; возвращает (колонки, строки)"""
+    if name not in QUERIES:
+        raise ValueError(f"Неизвестный запрос: {name}")
+    sql, param_names, _ = QUERIES[name]
+    # Снимки хранятся в naive UTC — граница периода считается здесь же
+    if params.get("days") is not None:
+        params["since"] = (datetime.now(timezone.utc) - timedelta(days=params["days"])).replace(tzinfo=None)
+    missing = [p for p in param_names if params.get(p) is None]
+    if missing:
+        raise ValueError(f"Не заданы параметры: {', '.join(missing)}")
+
+    con = connect()
+    try:
+        result = con.execute(sql, [params[p] for p in param_names])
+        columns = [d[0] for d in result.description]
+        rows = result.fetchall()
+    finally:
+        con.close()
+    logger.info(f"Analytics query {name} {params}: {len(rows)} rows")
+    return columns, rows
+
+def format_table(columns: list, rows: list, max_rows: int = 30) -> str:
+    """Моноширинная таблица для вывода в консоль / <pre> в Telegram"""
+    cells = [[str(c) for c in columns]] + [
+        [f"{v:.4g}" if isinstance(v, float) else str(v)[:19] for v in row] for row in rows[:max_rows]
+    ]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(columns))]
+    lines = ["  ".join(v.ljust(w) for v, w in zip(r, widths)) for r in cells]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    if len(rows) > max_rows:
+        lines.append(f"... ещё {len(rows) - max_rows}")
+    return "\n".join(lines)
+
+def install_extension():
+    """Деплой: скачивает расширение sqlite в DUCKDB_EXTENSION_DIR (или ~/.duckdb), чтобы запросы работали офлайн"""
+    import duckdb
+
+    con = duckdb.connect(database=":memory:")
+    if config.DUCKDB_EXTENSION_DIR:
+        con.execute(f"SET extension_directory = '{config.DUCKDB_EXTENSION_DIR}'")
+    con.execute("INSTALL sqlite")
+    con.execute("LOAD sqlite")
+    con.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Аналитические запросы по истории снимков (DuckDB)")
+    parser.add_argument("query", nargs="?", choices=sorted(QUERIES))
+    parser.add_argument("--ticker")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--install-extension", action="store_true", help="установить расширение sqlite (при деплое)")
+    args = parser.parse_args()
+
+    if args.install_extension:
+        install_extension()
+        print("✅ Расширение DuckDB sqlite установлено")
+        return
+    if args.query is None:
+        parser.error("укажите запрос")
+
+    params = {"ticker": args.ticker.upper() if args.ticker else None, "days": args.days, "limit": args.limit}
+    columns, rows = run_query(args.query, **params)
+    print(format_table(columns, rows, max_rows=len(rows)))
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,64 @@
 import asyncio
+import html
+import os
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, FSInputFile
 from loguru import logger
-from src.db.models import SessionLocal, Ticker, SignalLog
+from src.db.models import SessionLocal, Ticker, LatestPutCallRatio
 from src.db.models import Subscriber
-from src.db.models import PutCallRatio
+from src.monitoring import metrics
+from src.db.read_models import get_recent_signals, get_latest_pcr, get_watchlist, invalidate, paginate
 import config.config as config
 from datetime import datetime, timezone
 
-import os
-from dotenv import load_dotenv
-
 class SettingsState(StatesGroup):
     waiting_for_value = State()
 
-# Загрузка токена из .env
-load_dotenv()
-BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+dp = Dispatcher()
+_bot = None
 
-if not BOT_TOKEN:
-    raise ValueError("Пожалуйста, укажите TELEGRAM_BOT_TOKEN в файле .env")
+def get_bot() -> Bot:
+    """Создаёт Bot при первом обращении: токен проверяется при запуске, а не при импорте модуля"""
+    global _bot
+    if _bot is None:
+        if not config.TELEGRAM_BOT_TOKEN:
+            raise ValueError("Пожалуйста, укажите TELEGRAM_BOT_TOKEN в файле .env")
+        session = None
+        if config.TELEGRAM_API_URL:
+            from aiogram.client.session.aiohttp import AiohttpSession
+            from aiogram.client.telegram import TelegramAPIServer
+            session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
+        _bot = Bot(
+            token=config.TELEGRAM_BOT_TOKEN,
+            session=session,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
+    return _bot
 
-bot = Bot(
-    token=BOT_TOKEN,
-    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-)
-dp = Dispatcher()
+async def signal_chart(ticker: str):
+    """График для вложения в рассылку, если включён CHART_ATTACH_TO_SIGNALS"""
+    if not config.CHART_ATTACH_TO_SIGNALS:
+        return None
+    from src.bot.charts import get_chart
+    try:
+        return await get_chart(ticker)
+    except Exception as e:
+        logger.error(f"Chart for {ticker} failed, sending text only: {e}")
+        return None
 
-logger.add("logs/bot.log", rotation="1 MB", retention="7 days", level="INFO")
+async def send_alert(user_id: int, text: str, chart: dict = None):
+    """Текст сигнала, либо фото графика с текстом в подписи"""
+    if chart is None:
+        await get_bot().send_message(user_id, text, disable_web_page_preview=True)
+        return
+    from src.bot.charts import chart_input, remember_file_id
+    message = await get_bot().send_photo(user_id, chart_input(chart), caption=text)
+    remember_file_id(chart, message)
 
 async def send_signal_to_subscribers(signal_data: dict):
     """Отправляет сигнал всем подписчикам"""
@@ -57,16 +83,20 @@ async def send_signal_to_subscribers(signal_data: dict):
         f"<b>OI Change:</b> {signal_data.get('oi_change', 0):+,}\n"
         f"<b>Last Price:</b> ${signal_data.get('last_price', 0):.2f}\n"
         f"<b>Underlying:</b> ${signal_data.get('underlying_price', 0):.2f}\n"
-        f"<b>Time:</b> {signal_data.get('signal_time', datetime.now(timezone.utc)()).strftime('%Y-%m-%d %H:%M')} UTC\n\n"
+        f"<b>Time:</b> {signal_data.get('signal_time', datetime.now(timezone.utc)).strftime('%Y-%m-%d %H:%M')} UTC\n\n"
         f"📊 <a href='https://finance.yahoo.com/quote/{signal_data['ticker']}/options'>View on Yahoo Finance</a>"
     )
     
+    chart = await signal_chart(signal_data['ticker'])
+    
     # Отправка всем подписчикам
     for sub in subscribers:
         try:
-            await bot.send_message(sub.user_id, text, disable_web_page_preview=True)
+            with metrics.TELEGRAM_SEND_SECONDS.time(kind="OPTION"):
+                await send_alert(sub.user_id, text, chart)
             logger.info(f"Signal sent to user {sub.user_id}")
         except Exception as e:
+            metrics.TELEGRAM_SEND_FAILURES.inc(kind="OPTION")
             logger.error(f"Failed to send signal to user {sub.user_id}: {e}")
             if "bot was blocked" in str(e).lower():
                 session = SessionLocal()
@@ -87,10 +117,15 @@ async def send_pcr_signal_to_subscribers(pcr_row):
     
     emoji = "🐻" if pcr_row['signal_type'] == 'BEARISH' else "🐂"
     
+    # z-score относительно собственной истории тикера (NaN, пока история не накоплена)
+    zscore = pcr_row.get('pcr_zscore')
+    zscore_line = f"<b>Z-score:</b> {zscore:+.2f}\n" if zscore is not None and zscore == zscore else ""
+    
     text = (
         f"{emoji} <b>Put/Call Ratio Alert</b>\n\n"
         f"<b>Ticker:</b> {pcr_row['ticker']}\n"
-        f"<b>Signal:</b> {pcr_row['signal_type']}\n\n"
+        f"<b>Signal:</b> {pcr_row['signal_type']}\n"
+        f"{zscore_line}\n"
         f"<b>Volume PCR:</b> {pcr_row['pcr_volume']:.2f}\n"
         f"  • Calls: {int(pcr_row['call_volume']):,}\n"
         f"  • Puts: {int(pcr_row['put_volume']):,}\n\n"
@@ -100,10 +135,14 @@ async def send_pcr_signal_to_subscribers(pcr_row):
         f"📊 <a href='https://finance.yahoo.com/quote/{pcr_row['ticker']}/options'>View on Yahoo Finance</a>"
     )
     
+    chart = await signal_chart(pcr_row['ticker'])
+    
     for sub in subscribers:
         try:
-            await bot.send_message(sub.user_id, text, disable_web_page_preview=True)
+            with metrics.TELEGRAM_SEND_SECONDS.time(kind="PCR"):
+                await send_alert(sub.user_id, text, chart)
         except Exception as e:
+            metrics.TELEGRAM_SEND_FAILURES.inc(kind="PCR")
             logger.error(f"Failed to send PCR signal to {sub.user_id}: {e}")
 
 # === Команда /start ===
@@ -119,20 +158,88 @@ async def cmd_start(message: types.Message):
         "/watchlist — показать текущие тикеры\n"
         "/add [TICKER] — добавить тикер\n"
         "/remove [TICKER] — удалить тикер\n"
-        "/settings — настройки фильтров"
+        "/settings — настройки фильтров\n"
+        "/export [TICKER] [DAYS] — выгрузить историю (CSV)\n"
+        "/top_oi [DAYS] — топ контрактов по изменению OI\n"
+        "/iv_term [TICKER] [DAYS] — IV по дням (хранится только ближайшая экспирация)\n"
+        "/leaders [DAYS] — тикеры с наибольшим объёмом\n"
+        "/chart [TICKER] — IV smile и объём по страйкам"
     )
 
+# === Пагинация read models ===
+def pagination_keyboard(view: str, page: int, pages: int):
+    """Inline-клавиатура ◀️ / ▶️ для постраничного просмотра"""
+    if pages <= 1:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"page:{view}:{page - 1}"))
+    buttons.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="page:noop"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"page:{view}:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+def render_watchlist(page: int = 0):
+    symbols = get_watchlist()
+    if not symbols:
+        return "Список тикеров пуст.", None
+    items, page, pages = paginate(symbols, page, config.READ_MODEL_PAGE_SIZE * 4)
+    text = f"📌 Отслеживаемые тикеры ({len(symbols)}):\n" + "\n".join(items)
+    return text, pagination_keyboard("watchlist", page, pages)
+
+def render_signals(page: int = 0):
+    signals = get_recent_signals()
+    if not signals:
+        return "⚠️ Сигналов пока нет.", None
+    items, page, pages = paginate(signals, page)
+    text_lines = []
+    for s in items:
+        text_lines.append(
+            f"🚨 {s['ticker']} | {s['option_type']} | Strike: {s['strike']} | Exp: {s['expiration']}\n"
+            f"Volume change: {s['volume_change']} | IV change: {s['iv_change']}\n"
+            f"OI change: {s['oi_change']}\n"
+            f"Time: {s['signal_time'].strftime('%Y-%m-%d %H:%M')}\n"
+            f"Source: {s['source']}"
+        )
+    return "\n\n".join(text_lines), pagination_keyboard("signals", page, pages)
+
+def render_pcr(page: int = 0):
+    pcr_data = get_latest_pcr()
+    if not pcr_data:
+        return "⚠️ Данных по Put/Call Ratio пока нет.", None
+    items, page, pages = paginate(pcr_data, page)
+    text_lines = ["📊 <b>Put/Call Ratios</b>\n"]
+    for pcr in items:
+        emoji = "🐻" if pcr['signal_type'] == 'BEARISH' else "🐂" if pcr['signal_type'] == 'BULLISH' else "➖"
+        text_lines.append(
+            f"{emoji} <b>{pcr['ticker']}</b> | {pcr['signal_type']}\n"
+            f"  Volume PCR: {pcr['pcr_volume']:.2f} (Calls: {pcr['call_volume']:,} | Puts: {pcr['put_volume']:,})\n"
+            f"  OI PCR: {pcr['pcr_oi']:.2f} (Calls: {pcr['call_oi']:,} | Puts: {pcr['put_oi']:,})\n"
+            f"  Time: {pcr['calculated_at'].strftime('%Y-%m-%d %H:%M')}\n"
+        )
+    return "\n".join(text_lines), pagination_keyboard("pcr", page, pages)
+
+READ_MODEL_VIEWS = {
+    "watchlist": render_watchlist,
+    "signals": render_signals,
+    "pcr": render_pcr
+}
+
+@dp.callback_query(lambda c: c.data.startswith("page:"))
+async def process_page_callback(callback: CallbackQuery):
+    parts = callback.data.split(":")
+    if len(parts) != 3 or parts[1] not in READ_MODEL_VIEWS:
+        await callback.answer()
+        return
+    text, keyboard = READ_MODEL_VIEWS[parts[1]](int(parts[2]))
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
 # === Команда /watchlist ===
 @dp.message(Command(commands=["watchlist"]))
 async def cmd_watchlist(message: types.Message):
-    session = SessionLocal()
-    tickers = session.query(Ticker).all()
-    session.close()
-    if tickers:
-        text = "📌 Отслеживаемые тикеры:\n" + "\n".join([t.symbol for t in tickers])
-    else:
-        text = "Список тикеров пуст."
-    await message.answer(text)
+    text, keyboard = render_watchlist()
+    await message.answer(text, reply_markup=keyboard)
 
 # === Команда /add [TICKER] ===
 @dp.message(Command(commands=["add"]))
@@ -150,6 +257,7 @@ async def cmd_add(message: types.Message):
         new_ticker = Ticker(symbol=symbol)
         session.add(new_ticker)
         session.commit()
+        invalidate('watchlist')
         await message.answer(f"✅ {symbol} добавлен в список тикеров.")
     session.close()
 
@@ -165,7 +273,11 @@ async def cmd_remove(message: types.Message):
     existing = session.query(Ticker).filter(Ticker.symbol == symbol).first()
     if existing:
         session.delete(existing)
+        # Удалённый тикер не должен оставаться в /pcr
+        session.query(LatestPutCallRatio).filter(LatestPutCallRatio.ticker == symbol).delete()
         session.commit()
+        invalidate('watchlist')
+        invalidate('latest_pcr')
         await message.answer(f"❌ {symbol} удалён из списка тикеров.")
     else:
         await message.answer(f"{symbol} не найден в списке.")
@@ -174,23 +286,8 @@ async def cmd_remove(message: types.Message):
 # === Команда /signals ===
 @dp.message(Command(commands=["signals"]))
 async def cmd_signals(message: types.Message):
-    session = SessionLocal()
-    signals = session.query(SignalLog).order_by(SignalLog.signal_time.desc()).limit(10).all()
-    session.close()
-    if not signals:
-        await message.answer("⚠️ Сигналов пока нет.")
-        return
-
-    text_lines = []
-    for s in signals:
-        text_lines.append(
-            f"🚨 {s.ticker} | {s.option_type} | Strike: {s.strike} | Exp: {s.expiration}\n"
-            f"Volume change: {s.volume_change} | IV change: {s.iv_change}\n"
-            f"OI change: {s.oi_change}\n"
-            f"Time: {s.signal_time.strftime('%Y-%m-%d %H:%M')}\n"
-            f"Source: {s.source}"
-        )
-    await message.answer("\n\n".join(text_lines))
+    text, keyboard = render_signals()
+    await message.answer(text, reply_markup=keyboard)
     
 @dp.message(Command(commands=["settings"]))
 async def cmd_settings(message: types.Message):
@@ -208,27 +305,9 @@ async def cmd_settings(message: types.Message):
     
 @dp.message(Command(commands=["pcr"]))
 async def cmd_pcr(message: types.Message):
-    """Показать текущие Put/Call Ratio для всех тикеров"""
-    session = SessionLocal()
-    pcr_data = session.query(PutCallRatio).order_by(PutCallRatio.calculated_at.desc()).limit(10).all()
-    session.close()
-    
-    if not pcr_data:
-        await message.answer("⚠️ Данных по Put/Call Ratio пока нет.")
-        return
-    
-    text_lines = ["📊 <b>Put/Call Ratios</b>\n"]
-    
-    for pcr in pcr_data:
-        emoji = "🐻" if pcr.signal_type == 'BEARISH' else "🐂" if pcr.signal_type == 'BULLISH' else "➖"
-        text_lines.append(
-            f"{emoji} <b>{pcr.ticker}</b> | {pcr.signal_type}\n"
-            f"  Volume PCR: {pcr.pcr_volume:.2f} (Calls: {pcr.call_volume:,} | Puts: {pcr.put_volume:,})\n"
-            f"  OI PCR: {pcr.pcr_oi:.2f} (Calls: {pcr.call_oi:,} | Puts: {pcr.put_oi:,})\n"
-            f"  Time: {pcr.calculated_at.strftime('%Y-%m-%d %H:%M')}\n"
-        )
-    
-    await message.answer("\n".join(text_lines))
+    """Показать последний Put/Call Ratio по каждому тикеру"""
+    text, keyboard = render_pcr()
+    await message.answer(text, reply_markup=keyboard)
 
 # Обработчик callback для показа текущих настроек
 @dp.callback_query(lambda c: c.data == "setting_show")
@@ -340,11 +419,177 @@ async def cmd_unsubscribe(message: types.Message):
     
     session.close()
 
+# === Команда /export [TICKER] [DAYS] ===
+@dp.message(Command(commands=["export"]))
+async def cmd_export(message: types.Message):
+    args = message.text.split()
+    if len(args) != 3 or not args[2].isdigit():
+        await message.answer("Использование: /export [TICKER] [DAYS]")
+        return
+    symbol, days = args[1].upper(), int(args[2])
+    if not 1 <= days <= config.EXPORT_MAX_DAYS:
+        await message.answer(f"❌ DAYS должно быть от 1 до {config.EXPORT_MAX_DAYS}")
+        return
+
+    from src.data.export import export_history, is_valid_symbol
+
+    if symbol != "ALL" and not is_valid_symbol(symbol):
+        await message.answer("❌ Некорректный тикер")
+        return
+
+    await message.answer(f"⏳ Готовлю выгрузку {symbol} за {days} дн...")
+    path = None
+    try:
+        # Выгрузка идёт в отдельном потоке, чтобы не блокировать остальные обработчики
+        path = await asyncio.to_thread(export_history, symbol, days, "csv")
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        if size_mb > config.TELEGRAM_MAX_DOCUMENT_MB:
+            await message.answer(
+                f"❌ Архив слишком большой для Telegram ({size_mb:.0f} MB). "
+                f"Уменьшите DAYS или используйте CLI: python -m src.data.export {symbol} {days}"
+            )
+            return
+        await message.answer_document(FSInputFile(path, filename=os.path.basename(path)))
+    except Exception as e:
+        logger.error(f"Export failed for {symbol}: {e}")
+        await message.answer("❌ Не удалось подготовить выгрузку")
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+# === Аналитика (DuckDB) ===
+async def answer_analytics(message: types.Message, query: str, title: str, **params):
+    """Выполняет аналитический запрос в отдельном потоке и отвечает таблицей"""
+    from src.analytics.queries import run_query, format_table
+
+    try:
+        columns, rows = await asyncio.to_thread(run_query, query, **params)
+    except Exception as e:
+        logger.error(f"Analytics query {query} failed: {e}")
+        await message.answer("❌ Не удалось выполнить запрос")
+        return
+    if not rows:
+        await message.answer("⚠️ Нет данных за выбранный период.")
+        return
+    await message.answer(f"<b>{html.escape(title)}</b>\n<pre>{html.escape(format_table(columns, rows))}</pre>")
+
+def parse_days(value: str, default: int = 7):
+    """DAYS из аргумента команды; None, если значение некорректно"""
+    if value is None:
+        return default
+    if not value.isdigit() or not 1 <= int(value) <= config.ANALYTICS_MAX_DAYS:
+        return None
+    return int(value)
+
+@dp.message(Command(commands=["top_oi"]))
+async def cmd_top_oi(message: types.Message):
+    args = message.text.split()
+    days = parse_days(args[1] if len(args) > 1 else None)
+    if days is None:
+        await message.answer(f"Использование: /top_oi [DAYS], DAYS от 1 до {config.ANALYTICS_MAX_DAYS}")
+        return
+    await answer_analytics(message, "top_oi_change", f"Топ-20 по изменению OI за {days} дн.", days=days, limit=20)
+
+@dp.message(Command(commands=["iv_term"]))
+async def cmd_iv_term(message: types.Message):
+    args = message.text.split()
+    days = parse_days(args[2] if len(args) > 2 else None, default=30)
+    if len(args) < 2 or days is None:
+        await message.answer(
+            f"Использование: /iv_term [TICKER] [DAYS], DAYS от 1 до {config.ANALYTICS_MAX_DAYS}\n"
+            "Загружается только ближайшая экспирация, поэтому в ответе одна экспирация на день."
+        )
+        return
+    symbol = args[1].upper()
+    await answer_analytics(message, "iv_term_structure", f"IV term structure {symbol} за {days} дн.", ticker=symbol, days=days)
+
+@dp.message(Command(commands=["leaders"]))
+async def cmd_leaders(message: types.Message):
+    args = message.text.split()
+    days = parse_days(args[1] if len(args) > 1 else None, default=1)
+    if days is None:
+        await message.answer(f"Использование: /leaders [DAYS], DAYS от 1 до {config.ANALYTICS_MAX_DAYS}")
+        return
+    await answer_analytics(message, "volume_leaders", f"Лидеры по объёму опционов за {days} дн.", days=days, limit=20)
+
+# === Команда /chart [TICKER] ===
+@dp.message(Command(commands=["chart"]))
+async def cmd_chart(message: types.Message):
+    args = message.text.split()
+    if len(args) != 2:
+        await message.answer("Использование: /chart [TICKER]")
+        return
+    symbol = args[1].upper()
+
+    from src.data.export import is_valid_symbol
+    from src.bot.charts import get_chart, chart_input, remember_file_id
+
+    # Тикер попадает в HTML-ответ и подпись — принимаем только допустимые символы
+    if not is_valid_symbol(symbol):
+        await message.answer("❌ Некорректный тикер")
+        return
+
+    try:
+        chart = await get_chart(symbol)
+    except Exception as e:
+        logger.error(f"Chart failed for {symbol}: {e}")
+        await message.answer("❌ Не удалось построить график")
+        return
+    if chart is None:
+        await message.answer(f"⚠️ Нет данных по {symbol}. Добавьте тикер через /add и дождитесь обновления.")
+        return
+    sent = await message.answer_photo(chart_input(chart), caption=f"📈 {symbol}: IV smile и объём по страйкам")
+    remember_file_id(chart, sent)
+
 # === Запуск бота ===
+async def start_webhook():
+    """Приём апдейтов через webhook на aiohttp сервере"""
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    if not config.WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET не задан — запросы к webhook не проверяются")
+
+    app = web.Application()
+    # handle_in_background: Telegram сразу получает 200, апдейты обрабатываются параллельно
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=get_bot(),
+        secret_token=config.WEBHOOK_SECRET,
+        handle_in_background=True
+    ).register(app, path=config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=get_bot())
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEBHOOK_LISTEN_HOST, config.WEBHOOK_LISTEN_PORT)
+    await site.start()
+    logger.info(f"Webhook server listening on {config.WEBHOOK_LISTEN_HOST}:{config.WEBHOOK_LISTEN_PORT}{config.WEBHOOK_PATH}")
+
+    if config.WEBHOOK_BASE_URL:
+        await get_bot().set_webhook(
+            url=config.WEBHOOK_BASE_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info("Webhook registered in Telegram")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
 async def start_bot():
-    logger.info("🚀 Telegram bot started")
-    await dp.start_polling(bot)
+    logger.info(f"🚀 Telegram bot started ({config.BOT_DELIVERY_MODE})")
+    if config.BOT_DELIVERY_MODE == "webhook":
+        await start_webhook()
+        return
+    # Telegram не отдаёт getUpdates, пока установлен webhook
+    await get_bot().delete_webhook(drop_pending_updates=False)
+    await dp.start_polling(get_bot())
 
 # === Точка входа для main.py ===
 if __name__ == "__main__":
+    from config.logs import setup_logging
+    setup_logging()
     asyncio.run(start_bot())
@@ -0,0 +1,153 @@
+"""
+Графики по последнему снимку цепочки: улыбка IV и объём по страйкам.
+
+matplotlib работает в отдельных процессах (ProcessPoolExecutor), event loop бота
+только ждёт готовый PNG. Картинки кэшируются по (тикер, snapshot_time): повторный
+/chart и вложения к рассылке в том же цикле не перерисовываются, а после первой
+отправки переиспользуют file_id Telegram вместо повторной загрузки.
+"""
+import asyncio
+import io
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from src.monitoring import metrics
+import config.config as config
+
+_pool = None
+_cache = OrderedDict()  # (ticker, snapshot_time) -> {'key', 'png', 'file_id'}
+_inflight = {}  # (ticker, snapshot_time) -> asyncio.Future, чтобы не рисовать одно и то же параллельно
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: дочерний процесс не наследует потоки и соединения с БД родителя
+        _pool = ProcessPoolExecutor(
+            max_workers=config.CHART_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def render_chain_chart(ticker: str, snapshot_label: str, rows: list) -> bytes:
+    """Рисует PNG в дочернем процессе; rows — кортежи (option_type, strike, volume, open_interest, iv)"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    sides = {
+        'CALL': sorted((r[1], r[2] or 0, r[4] or 0) for r in rows if r[0] == 'CALL'),
+        'PUT': sorted((r[1], r[2] or 0, r[4] or 0) for r in rows if r[0] == 'PUT')
+    }
+    strikes = sorted({r[1] for r in rows})
+    width = min((b - a for a, b in zip(strikes, strikes[1:])), default=1) * 0.8
+
+    fig, (ax_iv, ax_volume) = plt.subplots(2, 1, figsize=(8, 7), sharex=True, dpi=100)
+    for option_type, color in (('CALL', 'tab:green'), ('PUT', 'tab:red')):
+        points = [p for p in sides[option_type] if p[2] > 0]
+        if points:
+            ax_iv.plot([p[0] for p in points], [p[2] * 100 for p in points], marker='.', color=color, label=option_type)
+    ax_iv.set_ylabel("IV, %")
+    ax_iv.set_title(f"{ticker} — IV smile и объём по страйкам ({snapshot_label} UTC)")
+    ax_iv.grid(alpha=0.3)
+    ax_iv.legend()
+
+    # Колы вверх, путы вниз — перекос потока виден сразу
+    ax_volume.bar([p[0] for p in sides['CALL']], [p[1] for p in sides['CALL']], width=width, color='tab:green', label='CALL')
+    ax_volume.bar([p[0] for p in sides['PUT']], [-p[1] for p in sides['PUT']], width=width, color='tab:red', label='PUT')
+    ax_volume.axhline(0, color='black', linewidth=0.5)
+    ax_volume.set_xlabel("Strike")
+    ax_volume.set_ylabel("Volume")
+    ax_volume.grid(alpha=0.3)
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
+
+def latest_snapshot_time(ticker: str):
+    """Время последнего снимка тикера (ключ кэша) или None"""
+    from sqlalchemy import func
+    from src.db.models import SessionLocal, OptionSnapshot
+
+    session = SessionLocal()
+    try:
+        return session.query(func.max(OptionSnapshot.snapshot_time)).filter(
+            OptionSnapshot.ticker == ticker
+        ).scalar()
+    finally:
+        session.close()
+
+def load_chain_rows(ticker: str, snapshot_time) -> list:
+    """Строки снимка для отрисовки — читаются только при промахе кэша"""
+    from src.db.models import SessionLocal, OptionSnapshot
+
+    session = SessionLocal()
+    try:
+        rows = session.query(
+            OptionSnapshot.option_type, OptionSnapshot.strike, OptionSnapshot.volume,
+            OptionSnapshot.open_interest, OptionSnapshot.implied_volatility
+        ).filter(OptionSnapshot.ticker == ticker, OptionSnapshot.snapshot_time == snapshot_time).all()
+        return [tuple(r) for r in rows]
+    finally:
+        session.close()
+
+def _remember(key, png: bytes) -> dict:
+    entry = _cache[key] = {'key': key, 'png': png, 'file_id': None}
+    while len(_cache) > config.CHART_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return entry
+
+async def get_chart(ticker: str):
+    """Запись кэша с PNG последнего снимка тикера; None, если данных нет"""
+    ticker = ticker.upper()
+    snapshot_time = await asyncio.to_thread(latest_snapshot_time, ticker)
+    if snapshot_time is None:
+        return None
+
+    key = (ticker, snapshot_time)
+    if key in _cache:
+        _cache.move_to_end(key)
+        metrics.CHART_REQUESTS.inc(result="hit")
+        return _cache[key]
+    if key in _inflight:
+        metrics.CHART_REQUESTS.inc(result="hit")
+        return await _inflight[key]
+
+    metrics.CHART_REQUESTS.inc(result="miss")
+    loop = asyncio.get_running_loop()
+    future = _inflight[key] = loop.create_future()
+    try:
+        rows = await asyncio.to_thread(load_chain_rows, ticker, snapshot_time)
+        start = time.perf_counter()
+        png = await loop.run_in_executor(
+            get_pool(), render_chain_chart, ticker, snapshot_time.strftime('%Y-%m-%d %H:%M'), rows
+        )
+        metrics.CHART_RENDER_SECONDS.observe(time.perf_counter() - start)
+        entry = _remember(key, png)
+        future.set_result(entry)
+        logger.debug(f"Chart rendered for {ticker} @ {snapshot_time}: {len(png) / 1024:.0f} KB")
+        return entry
+    except Exception as e:
+        future.set_exception(e)
+        # Ожидающих может не быть — помечаем исключение как полученное
+        future.exception()
+        raise
+    finally:
+        del _inflight[key]
+
+def chart_input(entry: dict):
+    """file_id уже загруженной картинки или сам PNG для первой отправки"""
+    from aiogram.types import BufferedInputFile
+
+    if entry['file_id']:
+        return entry['file_id']
+    ticker, snapshot_time = entry['key']
+    return BufferedInputFile(entry['png'], filename=f"{ticker}_{snapshot_time:%Y%m%d_%H%M}.png")
+
+def remember_file_id(entry: dict, message):
+    """Сохраняет file_id после успешной отправки фото"""
+    if entry['file_id'] is None and message is not None and message.photo:
+        entry['file_id'] = message.photo[-1].file_id
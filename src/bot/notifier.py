@@ -0,0 +1,95 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from loguru import logger
+from src.db.models import SessionLocal, SignalOutbox
+from src.db.read_models import push_recent_signal
+import config.config as config
+
+_attempts = {}  # id строки outbox -> число неудачных попыток доставки
+
+def _json_default(value):
+    """Сериализация numpy/pandas скаляров и datetime в JSON"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def enqueue_signal(session, kind: str, payload: dict):
+    """Кладёт сигнал в outbox (commit делает вызывающий код вместе с SignalLog)"""
+    session.add(SignalOutbox(
+        kind=kind,
+        payload=json.dumps(dict(payload), default=_json_default),
+        worker_id=config.WORKER_ID,
+        created_at=datetime.now(timezone.utc)
+    ))
+
+async def dispatch_signal(session, kind: str, payload: dict):
+    """В режиме worker сигнал уходит в outbox, иначе рассылается сразу"""
+    if config.RUN_MODE == "worker":
+        enqueue_signal(session, kind, payload)
+        return
+
+    from src.bot.bot import send_signal_to_subscribers, send_pcr_signal_to_subscribers
+    if kind == "PCR":
+        await send_pcr_signal_to_subscribers(payload)
+    else:
+        push_recent_signal(payload)
+        await send_signal_to_subscribers(payload)
+
+async def drain_outbox(batch_size: int = 100) -> int:
+    """
+    Отправляет накопленные воркерами сигналы подписчикам, возвращает число доставленных.
+    Доставленные строки удаляются; неудачные остаются в outbox и повторяются
+    на следующих проходах, пока не исчерпают NOTIFIER_MAX_RETRIES попыток.
+    """
+    from src.bot.bot import send_signal_to_subscribers, send_pcr_signal_to_subscribers
+
+    session = SessionLocal()
+    try:
+        # Строки, помеченные отправленными прежней версией notifier, больше не нужны
+        session.query(SignalOutbox).filter(SignalOutbox.sent_at.isnot(None)).delete(synchronize_session=False)
+        session.commit()
+
+        pending = session.query(SignalOutbox).order_by(SignalOutbox.id).limit(batch_size).all()
+
+        delivered = 0
+        for item in pending:
+            payload = json.loads(item.payload)
+            try:
+                if item.kind == "PCR":
+                    await send_pcr_signal_to_subscribers(payload)
+                else:
+                    if payload.get('signal_time'):
+                        payload['signal_time'] = datetime.fromisoformat(payload['signal_time'])
+                    push_recent_signal(payload)
+                    await send_signal_to_subscribers(payload)
+            except Exception as e:
+                attempts = _attempts[item.id] = _attempts.get(item.id, 0) + 1
+                if attempts < config.NOTIFIER_MAX_RETRIES:
+                    logger.warning(f"Failed to deliver outbox item {item.id} (attempt {attempts}): {e}")
+                    continue
+                logger.error(f"Dropping outbox item {item.id} after {attempts} attempts: {e}")
+            else:
+                delivered += 1
+            _attempts.pop(item.id, None)
+            session.delete(item)
+            session.commit()
+
+        return delivered
+    finally:
+        session.close()
+
+async def start_notifier():
+    """Единственный notifier: забирает сигналы из outbox и рассылает их"""
+    logger.info("🚀 Notifier started")
+    while True:
+        try:
+            sent = await drain_outbox()
+            if sent:
+                logger.info(f"Notifier delivered {sent} signals from outbox")
+                continue
+        except Exception as e:
+            logger.error(f"Notifier error: {e}")
+        await asyncio.sleep(config.NOTIFIER_POLL_SEC)
@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,12 +7,30 @@ load_dotenv()
 # Telegram Bot
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # свой Bot API сервер (локальный или фейковый для нагрузочных тестов)
+
+# Способ получения апдейтов: polling / webhook
+BOT_DELIVERY_MODE = os.getenv("BOT_DELIVERY_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL")  # публичный https URL; без него setWebhook не вызывается (локальные тесты)
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # проверяется по заголовку X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_LISTEN_HOST = os.getenv("WEBHOOK_LISTEN_HOST", "0.0.0.0")
+WEBHOOK_LISTEN_PORT = int(os.getenv("WEBHOOK_LISTEN_PORT", "8080"))
+
 # Database
 DATABASE_URL = "sqlite:///./options_data.db"
 
 # Scheduler settings
 UPDATE_INTERVAL_MIN = 10  # интервал обновления данных в минутах
 
+# Режим запуска: standalone (бот + планировщик), worker (шард тикеров), notifier (бот + рассылка из outbox)
+RUN_MODE = os.getenv("RUN_MODE", "standalone")
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+WORKER_HEARTBEAT_SEC = 30
+WORKER_LEASE_TTL_SEC = 90  # воркер без heartbeat дольше TTL считается мёртвым
+NOTIFIER_POLL_SEC = 5
+NOTIFIER_MAX_RETRIES = 5  # после стольких неудачных попыток сигнал удаляется из outbox
+
 # Signal detection thresholds (defaults)
 DEFAULT_VOLUME_SPIKE_K = 3.0
 DEFAULT_IV_THRESHOLD = 0.1  # 10%
@@ -21,12 +40,79 @@ DEFAULT_EXPIRATION_DAYS = 7
 PCR_BEARISH_THRESHOLD = 1.5
 PCR_BULLISH_THRESHOLD = 0.5
 
+# Адаптивные пороги PCR: z-score относительно собственной истории тикера (EWMA)
+PCR_EWMA_ALPHA = 0.05  # вес нового наблюдения (~ последние 40 циклов)
+PCR_ZSCORE_THRESHOLD = 2.5
+PCR_MIN_HISTORY = 20  # до накопления истории используются фиксированные пороги выше
+
+# Signal deduplication
+SIGNAL_COOLDOWN_MIN = 60  # повторный сигнал по тому же контракту не раньше чем через N минут
+SIGNAL_MATERIAL_VOLUME_CHANGE = 0.5  # 50% прироста объёма = существенное изменение
+SIGNAL_MATERIAL_MIN_VOLUME_DELTA = 100  # и не меньше N контрактов прироста (0→5 на крыльях не повод)
+SIGNAL_MATERIAL_IV_CHANGE = 0.05  # абсолютное изменение IV (5 п.п.)
+SIGNAL_MATERIAL_PCR_CHANGE = 0.25  # 25% изменения PCR
+
+# Read models для команд бота
+READ_MODEL_PAGE_SIZE = 5  # записей на страницу в /signals, /pcr, /watchlist
+RECENT_SIGNALS_BUFFER = 100  # размер кольцевого буфера последних сигналов
+READ_MODEL_CACHE_TTL_SEC = 30  # как часто перечитывать таблицы read models (их пишут и другие процессы)
+
+# Источник рыночных данных: yfinance / synthetic (офлайн, для нагрузочных тестов)
+DATA_PROVIDER = os.getenv("DATA_PROVIDER", "yfinance")
+SYNTHETIC_LATENCY_MS = float(os.getenv("SYNTHETIC_LATENCY_MS", "200"))  # средняя задержка ответа
+SYNTHETIC_ERROR_RATE = float(os.getenv("SYNTHETIC_ERROR_RATE", "0.01"))  # доля запросов с ошибкой
+SYNTHETIC_STRIKES = 40  # страйков на сторону цепочки
+SYNTHETIC_SEED = 42
+
 # API settings
 YFINANCE_RETRY_ATTEMPTS = 3
 YFINANCE_RETRY_DELAY = 5  # seconds
 REQUEST_TIMEOUT = 10  # seconds
 RATE_LIMIT_DELAY = 2
 
+# Экспорт истории
+EXPORT_DIR = "exports"
+EXPORT_CHUNK_SIZE = 5000  # строк на один запрос к БД
+EXPORT_MAX_DAYS = 90  # ограничение для /export в боте (CLI без ограничения)
+TELEGRAM_MAX_DOCUMENT_MB = 50  # лимит Bot API на отправку файла
+
+# Аналитика (DuckDB поверх SQLite и Parquet архива снимков)
+ANALYTICS_ARCHIVE_GLOB = os.getenv("ANALYTICS_ARCHIVE_GLOB", "archive/option_snapshots/*.parquet")
+ANALYTICS_MAX_DAYS = 365  # глубина для /top_oi, /iv_term, /leaders
+DUCKDB_EXTENSION_DIR = os.getenv("DUCKDB_EXTENSION_DIR")  # каталог расширений DuckDB (по умолчанию ~/.duckdb)
+
+# Графики (/chart и вложения к рассылке)
+CHART_WORKERS = 2  # процессов для отрисовки matplotlib
+CHART_CACHE_SIZE = 64  # картинок в кэше (ключ — тикер + время снимка)
+CHART_ATTACH_TO_SIGNALS = os.getenv("CHART_ATTACH_TO_SIGNALS", "0") == "1"
+
+# Metrics (Prometheus endpoint)
+# Воркеров на одном хосте обычно несколько — по умолчанию endpoint только у бота / standalone,
+# воркеру включайте явно со своим METRICS_PORT
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0" if RUN_MODE == "worker" else "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # у каждого воркера на одном хосте свой порт
+METRICS_PATH = "/metrics"
+
+# Профилирование циклов (opt-in)
+PROFILE_CYCLES = os.getenv("PROFILE_CYCLES", "0") == "1"
+PROFILE_SLOW_CYCLE_SEC = float(os.getenv("PROFILE_SLOW_CYCLE_SEC", "300"))  # циклы дольше порога сохраняются на диск
+PROFILE_SAMPLE_INTERVAL_SEC = 0.02  # 50 сэмплов стека в секунду
+PROFILE_DIR = "logs/profiles"
+PROFILE_KEEP = 20  # сколько последних медленных циклов хранить
+
+# Бюджет времени импорта точек входа, мс (проверка: python -m src.tools.import_budget)
+# Замеры (лучший из 3): main 270–400, migrate/init_db 250–390 (почти всё — sqlalchemy),
+# scheduler 300–410, bot 2700–3250 (aiogram ~2.5 с, Dispatcher и хендлеры создаются при импорте).
+# Запас ~1.5x на шум; pandas/yfinance на верхнем уровне (+350 мс и больше) выходят за бюджет.
+IMPORT_TIME_BUDGET_MS = {
+    "main": 600,
+    "src.db.migrate": 550,
+    "src.db.init_db": 550,
+    "src.data.scheduler": 600,
+    "src.bot.bot": 4500
+}
+
 # Logging
 LOG_ROTATION = "1 MB"
 LOG_RETENTION = "7 days"
\ No newline at end of file
@@ -0,0 +1,21 @@
+from loguru import logger
+import config.config as config
+
+# Файлы логов по компонентам (раньше добавлялись при импорте каждого модуля)
+LOG_FILES = [
+    "logs/parser.log",
+    "logs/signals.log",
+    "logs/scheduler.log",
+    "logs/bot.log"
+]
+
+_configured = False
+
+def setup_logging():
+    """Подключает файловые sinks loguru; вызывается явно из точек входа, повторный вызов ничего не делает"""
+    global _configured
+    if _configured:
+        return
+    for path in LOG_FILES:
+        logger.add(path, rotation=config.LOG_ROTATION, retention=config.LOG_RETENTION, level="INFO")
+    _configured = True
@@ -0,0 +1,146 @@
+"""
+Потоковая выгрузка истории: OptionSnapshot, SignalLog, PutCallRatio.
+
+    python -m src.data.export TICKER DAYS [--format csv|parquet] [--output PATH]
+
+TICKER = ALL выгружает все тикеры. Строки читаются порциями по EXPORT_CHUNK_SIZE
+(keyset-пагинация по id), поэтому память не зависит от размера истории.
+"""
+import argparse
+import csv
+import io
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from sqlalchemy import select
+from src.db.models import engine, OptionSnapshot, SignalLog, PutCallRatio
+import config.config as config
+
+# Таблица -> (модель, колонка времени для фильтра по DAYS)
+EXPORT_TABLES = {
+    "option_snapshots": (OptionSnapshot, OptionSnapshot.snapshot_time),
+    "signals_log": (SignalLog, SignalLog.signal_time),
+    "put_call_ratios": (PutCallRatio, PutCallRatio.calculated_at)
+}
+
+# Тикер попадает в имя файла архива — допускаем только символы биржевых тикеров (BRK.B, ^SPX)
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9.^-]{1,10}$")
+
+def is_valid_symbol(symbol: str) -> bool:
+    return bool(SYMBOL_PATTERN.match(symbol.upper()))
+
+def iter_chunks(model, time_column, ticker: str, since: datetime, chunk_size: int = None):
+    """Генератор порций строк (список кортежей); каждая порция — отдельный короткий запрос"""
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    columns = list(model.__table__.columns)
+    last_id = 0
+    with engine.connect() as conn:
+        while True:
+            query = select(*columns).where(model.id > last_id, time_column >= since)
+            if ticker:
+                query = query.where(model.ticker == ticker)
+            rows = conn.execute(query.order_by(model.id).limit(chunk_size)).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield [tuple(row) for row in rows]
+
+def _write_csv(zf: zipfile.ZipFile, name: str, columns: list, chunks) -> int:
+    total = 0
+    with zf.open(f"{name}.csv", "w", force_zip64=True) as raw:
+        with io.TextIOWrapper(raw, encoding="utf-8", newline="") as text:
+            writer = csv.writer(text)
+            writer.writerow(columns)
+            for chunk in chunks:
+                writer.writerows(chunk)
+                total += len(chunk)
+    return total
+
+def _arrow_schema(model):
+    import pyarrow as pa
+    from sqlalchemy import Integer, Float, DateTime, Boolean
+
+    fields = []
+    for column in model.__table__.columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+def _write_parquet(zf: zipfile.ZipFile, name: str, model, chunks, workdir: str) -> int:
+    # Parquet пишется во временный файл по row group на порцию, затем кладётся в архив без пересжатия
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для экспорта в Parquet установите pyarrow")
+
+    schema = _arrow_schema(model)
+    path = os.path.join(workdir, f"{name}.parquet")
+    total = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist([dict(zip(schema.names, row)) for row in chunk], schema=schema))
+            total += len(chunk)
+    zf.write(path, f"{name}.parquet", compress_type=zipfile.ZIP_STORED)
+    os.remove(path)
+    return total
+
+def export_history(ticker: str, days: int, fmt: str = "csv", output: str = None) -> str:
+    """Выгружает историю в zip-архив (по файлу на таблицу) и возвращает путь к нему"""
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    ticker = None if not ticker or ticker.upper() == "ALL" else ticker.upper()
+    if ticker and not is_valid_symbol(ticker):
+        raise ValueError(f"Некорректный тикер: {ticker!r}")
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+    if output is None:
+        os.makedirs(config.EXPORT_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        # mkstemp атомарно создаёт уникальный файл: два экспорта в одну секунду не перезапишут друг друга
+        fd, output = tempfile.mkstemp(dir=config.EXPORT_DIR, prefix=f"{ticker or 'ALL'}_{days}d_{stamp}_", suffix=f"_{fmt}.zip")
+        os.close(fd)
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir, zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, (model, time_column) in EXPORT_TABLES.items():
+                chunks = iter_chunks(model, time_column, ticker, since)
+                if fmt == "csv":
+                    columns = [column.name for column in model.__table__.columns]
+                    total = _write_csv(zf, name, columns, chunks)
+                else:
+                    total = _write_parquet(zf, name, model, chunks, workdir)
+                logger.info(f"Export {name}: {total} rows ({ticker or 'ALL'}, {days}d)")
+    except Exception:
+        # Не оставляем недописанный архив
+        if os.path.exists(output):
+            os.remove(output)
+        raise
+
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка истории опционов, сигналов и PCR")
+    parser.add_argument("ticker", help="тикер или ALL")
+    parser.add_argument("days", type=int, help="глубина выгрузки в днях")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", help="путь к zip-архиву")
+    args = parser.parse_args()
+
+    path = export_history(args.ticker, args.days, args.format, args.output)
+    print(f"✅ Выгрузка сохранена: {path}")
+
+if __name__ == "__main__":
+    main()
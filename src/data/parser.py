@@ -1,28 +1,24 @@
-import yfinance as yf
+import numpy as np
 import pandas as pd
 from loguru import logger
 from datetime import datetime, timezone
 import time
 from src.db.models import SessionLocal, OptionData, OptionSnapshot
+from src.data.providers import get_provider
+from src.monitoring import metrics
 import config.config as config
 
-logger.add("logs/parser.log", rotation=config.LOG_ROTATION, retention=config.LOG_RETENTION, level="INFO")
-
 def fetch_option_chain(ticker_symbol: str, retry_count=0):
-    """Получение цепочки опционов с retry логикой"""
+    """Получение цепочки опционов из источника данных (DATA_PROVIDER) с retry логикой"""
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        expirations = ticker.options
+        opt_chain, current_price, expiration = get_provider().fetch(ticker_symbol)
         
-        if not expirations:
+        if opt_chain is None:
             logger.warning(f"Нет доступных дат экспирации для {ticker_symbol}")
             return None, None, None
         
-        opt_chain = ticker.option_chain(expirations[0])
-        current_price = ticker.info.get('regularMarketPrice', ticker.info.get('currentPrice', None))
-        
-        logger.info(f"Опционы для {ticker_symbol} получены (экспирация {expirations[0]})")
-        return opt_chain, current_price, expirations[0]
+        logger.info(f"Опционы для {ticker_symbol} получены (экспирация {expiration})")
+        return opt_chain, current_price, expiration
         
     except Exception as e:
         logger.error(f"Ошибка при получении опционов {ticker_symbol}: {e}")
@@ -35,58 +31,94 @@ def fetch_option_chain(ticker_symbol: str, retry_count=0):
         
         return None, None, None
 
+# Компактная схема DataFrame: колонка yfinance -> (наша колонка, dtype, значение вместо NaN)
+# float32 достаточно для цен и IV (~7 значащих цифр), int32 — для объёма и OI.
+# strike остаётся float64: он участвует в сравнении с историей снимков.
+NUMERIC_COLUMNS = {
+    'strike': ('strike', np.float64, np.nan),
+    'lastPrice': ('last_price', np.float32, 0),
+    'bid': ('bid', np.float32, 0),
+    'ask': ('ask', np.float32, 0),
+    'impliedVolatility': ('implied_volatility', np.float32, 0),
+    'volume': ('volume', np.int32, 0),
+    'openInterest': ('open_interest', np.int32, 0)
+}
+
+def _stack_column(calls: pd.DataFrame, puts: pd.DataFrame, name: str, dtype, fill):
+    """Собирает колонку calls+puts сразу в один массив нужного типа, без промежуточных DataFrame"""
+    n_calls = len(calls)
+    out = np.full(n_calls + len(puts), fill, dtype=dtype)
+    for part, offset in ((calls, 0), (puts, n_calls)):
+        if name in part.columns:
+            out[offset:offset + len(part)] = part[name].to_numpy(dtype=np.float64, na_value=fill)
+    return out
+
+def _single_category(value, size: int):
+    """Категориальная колонка из одного повторяющегося значения (1 байт на строку)"""
+    return pd.Categorical.from_codes(np.zeros(size, dtype=np.int8), categories=[value])
+
+def frame_memory_bytes(df: pd.DataFrame) -> int:
+    """Полный объём памяти DataFrame, включая строки внутри object-колонок"""
+    return int(df.memory_usage(deep=True).sum())
+
 def parse_option_data(opt_chain, ticker_symbol: str, expiration_date: str, underlying_price: float):
-    """Преобразует цепочку опционов в DataFrame"""
+    """Преобразует цепочку опционов в компактный DataFrame"""
     if opt_chain is None:
         return pd.DataFrame()
     
-    calls = opt_chain.calls.copy()
-    puts = opt_chain.puts.copy()
+    calls = opt_chain.calls
+    puts = opt_chain.puts
+    n_calls, n_puts = len(calls), len(puts)
+    size = n_calls + n_puts
     
-    calls['option_type'] = 'CALL'
-    puts['option_type'] = 'PUT'
+    # Все колонки собираются напрямую из исходных массивов — один DataFrame на выходе
+    columns = {
+        'contract_symbol': np.concatenate([
+            calls['contractSymbol'].to_numpy(dtype=object) if 'contractSymbol' in calls.columns else np.full(n_calls, None, dtype=object),
+            puts['contractSymbol'].to_numpy(dtype=object) if 'contractSymbol' in puts.columns else np.full(n_puts, None, dtype=object)
+        ]),
+        'ticker': _single_category(ticker_symbol, size),
+        'option_type': pd.Categorical.from_codes(
+            np.repeat(np.array([0, 1], dtype=np.int8), [n_calls, n_puts]),
+            categories=['CALL', 'PUT']
+        ),
+        'expiration': _single_category(str(expiration_date), size)
+    }
+    for source, (target, dtype, fill) in NUMERIC_COLUMNS.items():
+        columns[target] = _stack_column(calls, puts, source, dtype, fill)
     
-    df = pd.concat([calls, puts], ignore_index=True)
-    df = df.fillna({
-        'volume': 0,
-        'open_interest': 0,
-        'implied_volatility': 0,
-        'last_price': 0,
-        'bid': 0,
-        'ask': 0
-    })
-
-
+    columns['in_the_money'] = np.concatenate([
+        calls['inTheMoney'].to_numpy(dtype=bool, na_value=False) if 'inTheMoney' in calls.columns else np.zeros(n_calls, dtype=bool),
+        puts['inTheMoney'].to_numpy(dtype=bool, na_value=False) if 'inTheMoney' in puts.columns else np.zeros(n_puts, dtype=bool)
+    ])
+    columns['underlying_price'] = np.full(size, np.nan if underlying_price is None else underlying_price, dtype=np.float32)
+    columns['updated_at'] = pd.Timestamp(datetime.now(timezone.utc))
     
-    # Добавляем метаданные
-    df['ticker'] = ticker_symbol
-    df['expiration'] = expiration_date
-    df['updated_at'] = datetime.now(timezone.utc)
-    df['underlying_price'] = underlying_price
-    
-    # Приведение столбцов к стандартному виду
-    df = df.rename(columns={
-        "contractSymbol": "contract_symbol",
-        "strike": "strike",
-        "lastPrice": "last_price",
-        "bid": "bid",
-        "ask": "ask",
-        "impliedVolatility": "implied_volatility",
-        "volume": "volume",
-        "openInterest": "open_interest",
-        "lastTradeDate": "last_trade_date",
-        "inTheMoney": "in_the_money"
-    })
+    df = pd.DataFrame(columns, index=pd.RangeIndex(size), copy=False)
     
+    logger.debug(f"{ticker_symbol}: {size} опционов, {frame_memory_bytes(df) / 1024:.1f} KB в памяти")
     return df
 
+def _for_storage(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    float32 -> float64 через кратчайшее десятичное представление: в SQLite попадает 0.3,
+    а не 0.30000001192092896. Компактные типы остаются только в памяти
+    """
+    out = df.copy(deep=False)
+    for name in df.columns:
+        if df[name].dtype == np.float32:
+            out[name] = df[name].to_numpy().astype(str).astype(np.float64)
+    return out
+
 def save_to_db(df: pd.DataFrame):
     """Сохраняет DataFrame с опционами в базу SQLite"""
     if df.empty:
         logger.warning("DataFrame пустой, нечего сохранять")
         return
     
+    df = _for_storage(df)
     session = SessionLocal()
+    started = time.perf_counter()
     try:
         for _, row in df.iterrows():
             # Сохранение в основную таблицу
@@ -121,9 +153,11 @@ def save_to_db(df: pd.DataFrame):
             session.add(snapshot)
             
         session.commit()
+        metrics.ROWS_WRITTEN.inc(len(df) * 2)
         logger.info(f"Сохранено {len(df)} записей в базу (данные + снимки)")
     except Exception as e:
         session.rollback()
         logger.error(f"Ошибка при сохранении в базу: {e}")
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+        metrics.SAVE_SECONDS.observe(time.perf_counter() - started)
\ No newline at end of file
@@ -0,0 +1,148 @@
+import math
+import random
+import time
+import zlib
+from datetime import date, timedelta
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import config.config as config
+
+class YFinanceProvider:
+    """Цепочка ближайшей экспирации из Yahoo Finance"""
+    name = "yfinance"
+
+    def fetch(self, ticker_symbol: str):
+        """Возвращает (opt_chain с .calls/.puts, цена базового актива, экспирация) или (None, None, None)"""
+        # yfinance тянет за собой тяжёлые зависимости — импортируем только при первом запросе
+        import yfinance as yf
+
+        ticker = yf.Ticker(ticker_symbol)
+        expirations = ticker.options
+        if not expirations:
+            return None, None, None
+
+        opt_chain = ticker.option_chain(expirations[0])
+        current_price = ticker.info.get('regularMarketPrice', ticker.info.get('currentPrice', None))
+        return opt_chain, current_price, expirations[0]
+
+class SyntheticProvider:
+    """
+    Офлайн-источник для нагрузочных тестов: цепочки в формате yfinance,
+    цена, IV и объёмы эволюционируют случайным блужданием между вызовами.
+    Латентность и доля ошибок настраиваются.
+    """
+    name = "synthetic"
+
+    def __init__(self, latency_ms: float = None, error_rate: float = None, strikes: int = None, seed: int = None):
+        self.latency_ms = config.SYNTHETIC_LATENCY_MS if latency_ms is None else latency_ms
+        self.error_rate = config.SYNTHETIC_ERROR_RATE if error_rate is None else error_rate
+        self.strikes = strikes or config.SYNTHETIC_STRIKES
+        self.seed = config.SYNTHETIC_SEED if seed is None else seed
+        self._state = {}  # тикер -> состояние случайного блуждания
+
+    def _ticker_state(self, ticker_symbol: str) -> dict:
+        state = self._state.get(ticker_symbol)
+        if state is None:
+            rng = np.random.default_rng([self.seed, zlib.crc32(ticker_symbol.encode())])
+            price = float(rng.uniform(10, 500))
+            state = self._state[ticker_symbol] = {
+                'rng': rng,
+                'price': price,
+                'iv': float(rng.uniform(0.2, 0.8)),
+                'base_volume': float(rng.uniform(50, 5000)),
+                'oi': {},  # тип -> {страйк: OI}
+                'strike_step': max(round(price * 0.025 * 2) / 2, 0.5)
+            }
+        return state
+
+    def _side(self, state: dict, ticker_symbol: str, expiration: str, strikes: np.ndarray, option_type: str, years: float):
+        rng = state['rng']
+        price, iv = state['price'], state['iv']
+        moneyness = np.log(strikes / price)
+
+        # Улыбка волатильности + шум
+        implied_volatility = np.clip(iv + 0.8 * moneyness ** 2 + rng.normal(0, 0.01, len(strikes)), 0.01, None)
+        intrinsic = np.maximum(price - strikes, 0) if option_type == 'C' else np.maximum(strikes - price, 0)
+        time_value = price * implied_volatility * math.sqrt(years) * 0.4 * np.exp(-moneyness ** 2 / (2 * max(iv, 0.05) ** 2))
+        last_price = np.round(intrinsic + time_value, 2)
+        spread = np.maximum(last_price * 0.05, 0.01)
+
+        # Объём убывает от денег; редкие всплески дают сигналы
+        volume = rng.poisson(state['base_volume'] * np.exp(-np.abs(moneyness) * 8)).astype(float)
+        spikes = rng.random(len(strikes)) < 0.01
+        volume[spikes] *= rng.uniform(5, 30, spikes.sum())
+
+        # OI хранится только для текущей сетки страйков: ушедшие с блужданием цены страйки забываются
+        previous_oi = state['oi'].get(option_type, {})
+        oi = np.array([previous_oi.get(s, float(rng.uniform(100, 20000))) for s in strikes])
+        oi = np.maximum(oi + rng.normal(0, oi * 0.02), 0).round()
+        state['oi'][option_type] = dict(zip(strikes.tolist(), oi.tolist()))
+
+        symbol_date = expiration.replace('-', '')[2:]
+        return pd.DataFrame({
+            'contractSymbol': [f"{ticker_symbol}{symbol_date}{option_type}{int(s * 1000):08d}" for s in strikes],
+            'lastTradeDate': pd.Timestamp.now(tz='UTC'),
+            'strike': strikes,
+            'lastPrice': last_price,
+            'bid': np.maximum(last_price - spread, 0),
+            'ask': last_price + spread,
+            'change': 0.0,
+            'percentChange': 0.0,
+            'volume': volume,
+            'openInterest': oi,
+            'impliedVolatility': implied_volatility,
+            'inTheMoney': intrinsic > 0,
+            'contractSize': 'REGULAR',
+            'currency': 'USD'
+        })
+
+    def fetch(self, ticker_symbol: str):
+        if self.latency_ms:
+            time.sleep(random.expovariate(1 / self.latency_ms) / 1000)
+        if random.random() < self.error_rate:
+            raise ConnectionError(f"synthetic error for {ticker_symbol}")
+
+        state = self._ticker_state(ticker_symbol)
+        rng = state['rng']
+        # Шаг случайного блуждания цены и уровня IV
+        state['price'] *= math.exp(rng.normal(0, 0.005))
+        state['iv'] = float(np.clip(state['iv'] + rng.normal(0, 0.01), 0.05, 2.0))
+
+        today = date.today()
+        expiration_date = today + timedelta(days=(4 - today.weekday()) % 7 or 7)  # ближайшая пятница
+        expiration = expiration_date.isoformat()
+        years = max((expiration_date - today).days, 1) / 365
+
+        step = state['strike_step']
+        center = round(state['price'] / step) * step
+        half = self.strikes // 2
+        strikes = np.round(center + step * np.arange(-half, self.strikes - half), 2)
+        strikes = strikes[strikes > 0]
+
+        opt_chain = SimpleNamespace(
+            calls=self._side(state, ticker_symbol, expiration, strikes, 'C', years),
+            puts=self._side(state, ticker_symbol, expiration, strikes, 'P', years)
+        )
+        return opt_chain, round(state['price'], 2), expiration
+
+PROVIDERS = {
+    "yfinance": YFinanceProvider,
+    "synthetic": SyntheticProvider
+}
+
+_provider = None
+
+def get_provider():
+    """Источник данных из config.DATA_PROVIDER (создаётся один раз)"""
+    global _provider
+    if _provider is None:
+        if config.DATA_PROVIDER not in PROVIDERS:
+            raise ValueError(f"Неизвестный DATA_PROVIDER: {config.DATA_PROVIDER}")
+        _provider = PROVIDERS[config.DATA_PROVIDER]()
+    return _provider
+
+def set_provider(provider):
+    """Подменяет источник данных (нагрузочные тесты, реплей)"""
+    global _provider
+    _provider = provider
@@ -1,99 +1,221 @@
 import asyncio
 from datetime import datetime, timezone
-import pandas as pd
 from loguru import logger
 
-from src.data.parser import fetch_option_chain, parse_option_data, save_to_db
 from src.db.models import SessionLocal, Ticker, SignalLog  # <- здесь SignalLog правильно
-from src.signals.engine import generate_signals
-from src.bot.bot import send_signal_to_subscribers
+from src.signals.dedup import option_signal_key, pcr_signal_key, should_emit, remember_signal, load_signal_index, prune_signal_index
+from src.data.sharding import shard_tickers, acquire_ticker, release_ticker
+from src.bot.notifier import dispatch_signal
+from src.db.read_models import upsert_latest_pcr
+from src.monitoring import metrics, profiler
 import config.config as config
 from src.db.models import SessionLocal, Ticker, SignalLog, PutCallRatio
-from src.bot.bot import send_signal_to_subscribers, send_pcr_signal_to_subscribers
-
-logger.add("logs/scheduler.log", rotation="1 MB", retention="7 days", level="INFO")
 
 UPDATE_INTERVAL_MIN = config.UPDATE_INTERVAL_MIN
+# Колонки снимка, нужные для PCR: копятся за цикл и считаются одним проходом
+PCR_COLUMNS = ['ticker', 'option_type', 'volume', 'open_interest']
+
+_current_shard = None
+
+def get_cycle_tickers(session):
+    """Все тикеры в standalone режиме, в режиме worker — только свой шард"""
+    global _current_shard
+    if config.RUN_MODE != "worker":
+        return session.query(Ticker).all()
+
+    tickers = shard_tickers(session, config.WORKER_ID)
+    shard = frozenset(t.symbol for t in tickers)
+    if _current_shard is not None and shard != _current_shard:
+        # Шард перераспределён — подтягиваем состояние дедупликации, записанное другими воркерами
+        logger.info(f"Shard rebalanced: +{len(shard - _current_shard)} / -{len(_current_shard - shard)} tickers")
+        load_signal_index(session, force=True)
+    _current_shard = shard
+    return tickers
 
 async def update_options_data():
     """Получение и сохранение данных по всем тикерам"""
     session = SessionLocal()
-    tickers = session.query(Ticker).all()
+    tickers = get_cycle_tickers(session)
     session.close()
 
     if not tickers:
         logger.warning("Список тикеров пуст. Нет данных для обновления.")
         return
 
+    worker = config.RUN_MODE == "worker"
+    pcr_inputs = []
     for t in tickers:
-        chain, underlying_price, exp_date = fetch_option_chain(t.symbol)
-        df = parse_option_data(chain, t.symbol, exp_date, underlying_price)
+        if worker and not acquire_ticker(t.symbol, config.WORKER_ID):
+            continue
+        try:
+            with profiler.span("ticker", symbol=t.symbol):
+                df = await update_ticker(t.symbol)
+            if not df.empty:
+                pcr_inputs.append(df[PCR_COLUMNS])
+        except Exception as e:
+            # Ошибка одного тикера не должна останавливать цикл и процесс
+            logger.exception(f"Ошибка обработки {t.symbol}: {e}")
+        finally:
+            if worker:
+                release_ticker(t.symbol, config.WORKER_ID)
+
+    if pcr_inputs:
+        try:
+            with profiler.span("pcr"):
+                await update_pcr(pcr_inputs)
+        except Exception as e:
+            logger.exception(f"Ошибка расчёта PCR: {e}")
+
+    # Истёкшие состояния дедупликации не влияют на решения — не даём индексу расти
+    session = SessionLocal()
+    try:
+        prune_signal_index(session)
+        session.commit()
+    finally:
+        session.close()
+
+async def update_ticker(symbol: str):
+    """Загрузка, сохранение, сигналы и рассылка по одному тикеру; возвращает снимок для PCR"""
+    # pandas/yfinance загружаются при первом цикле, а не при импорте планировщика
+    from src.data.parser import fetch_option_chain, parse_option_data, save_to_db
+    from src.signals.engine import generate_signals
+
+    with profiler.span("fetch"), metrics.FETCH_SECONDS.time(ticker=symbol):
+        chain, underlying_price, exp_date = fetch_option_chain(symbol)
+    if chain is None:
+        metrics.FETCH_FAILURES.inc(ticker=symbol)
+    with profiler.span("parse"):
+        df = parse_option_data(chain, symbol, exp_date, underlying_price)
+    with profiler.span("save"):
         save_to_db(df)
-        
+
+    with profiler.span("rate_limit"):
         await asyncio.sleep(config.RATE_LIMIT_DELAY)
 
-        # Генерация сигналов (теперь возвращает два DataFrame)
-        signals_df, pcr_signals = generate_signals(df)
-        
-        # Сохранение обычных сигналов
+    with profiler.span("signal"):
+        signals_df = generate_signals(df)
         if not signals_df.empty:
-            session = SessionLocal()
-            for _, row in signals_df.iterrows():
-                signal = SignalLog(
-                    ticker=row['ticker'],
-                    option_type=row['option_type'],
-                    strike=row['strike'],
-                    expiration=str(row.get('expiration', '')),
-                    volume_change=row.get('volume', 0),
-                    iv_change=row.get('implied_volatility', 0),
-                    oi_change=row.get('open_interest', 0),
-                    source="yfinance"
-                )
-                session.add(signal)
-                
-                # Отправка сигнала подписчикам
-                signal_data = {
-                    'ticker': row['ticker'],
-                    'option_type': row['option_type'],
-                    'strike': row['strike'],
-                    'expiration': row.get('expiration', ''),
-                    'volume': row.get('volume', 0),
-                    'volume_change': 0,
-                    'implied_volatility': row.get('implied_volatility', 0),
-                    'iv_change': 0,
-                    'oi_change': row.get('open_interest', 0),
-                    'last_price': row.get('last_price', 0),
-                    'underlying_price': row.get('underlying_price', 0),
-                    'signal_time': datetime.now(timezone.utc)
-                }
-                await send_signal_to_subscribers(signal_data)
-                
-            session.commit()
-            session.close()
-            logger.info(f"Option signals for {t.symbol} saved and sent.")
+            await save_option_signals(symbol, signals_df)
+    return df
+
+async def update_pcr(pcr_inputs: list):
+    """PCR и его z-score по всем тикерам цикла: один pivot, одно обновление pcr_stats"""
+    import pandas as pd
+    from src.signals.engine import generate_pcr_signals
+
+    pcr_df = generate_pcr_signals(pd.concat(pcr_inputs, ignore_index=True))
+    if not pcr_df.empty:
+        await save_pcr_signals(pcr_df)
+
+async def save_option_signals(symbol: str, signals_df):
+    """Сохранение обычных сигналов и рассылка (с дедупликацией)"""
+    from src.data.providers import get_provider
+
+    source = get_provider().name
+    session = SessionLocal()
+    try:
+        sent = 0
+        for _, row in signals_df.iterrows():
+            # Дедупликация: не дублируем сигнал по тому же контракту в пределах cooldown
+            key = option_signal_key(row)
+            current = {
+                'volume': float(row.get('volume', 0) or 0),
+                'implied_volatility': float(row.get('implied_volatility', 0) or 0),
+                'open_interest': float(row.get('open_interest', 0) or 0)
+            }
+            if not should_emit(session, key, current):
+                metrics.SIGNALS_SUPPRESSED.inc(kind="OPTION")
+                continue
+            remember_signal(session, key, row['ticker'], 'OPTION', current)
+            metrics.SIGNALS_EMITTED.inc(kind="OPTION")
+            sent += 1
+            # Одно время для SignalLog и рассылки: по нему буфер /signals сверяется с историей
+            signal_time = datetime.now(timezone.utc)
+
+            signal = SignalLog(
+                ticker=row['ticker'],
+                option_type=row['option_type'],
+                strike=row['strike'],
+                expiration=str(row.get('expiration', '')),
+                volume_change=row.get('volume', 0),
+                iv_change=row.get('implied_volatility', 0),
+                oi_change=row.get('open_interest', 0),
+                signal_time=signal_time,
+                source=source
+            )
+            session.add(signal)
+        
+            # Отправка сигнала подписчикам
+            signal_data = {
+                'ticker': row['ticker'],
+                'option_type': row['option_type'],
+                'strike': row['strike'],
+                'expiration': row.get('expiration', ''),
+                'volume': row.get('volume', 0),
+                'volume_change': 0,
+                'implied_volatility': row.get('implied_volatility', 0),
+                'iv_change': 0,
+                'oi_change': row.get('open_interest', 0),
+                'last_price': row.get('last_price', 0),
+                'underlying_price': row.get('underlying_price', 0),
+                'signal_time': signal_time,
+                'source': source
+            }
+            with profiler.span("broadcast"):
+                await dispatch_signal(session, "OPTION", signal_data)
+        
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    logger.info(f"Option signals for {symbol} saved and sent: {sent}/{len(signals_df)} (остальные подавлены cooldown)")
+
+async def save_pcr_signals(pcr_df):
+    """PCR сохраняется каждый цикл как временной ряд; необычные значения рассылаются (с дедупликацией)"""
+    session = SessionLocal()
+    # Одна отметка времени на цикл: ряд PCR и read model совпадают
+    calculated_at = datetime.now(timezone.utc)
+    try:
+        sent = 0
+        for _, row in pcr_df.iterrows():
+            session.add(PutCallRatio(
+                ticker=row['ticker'],
+                call_volume=int(row['call_volume']),
+                put_volume=int(row['put_volume']),
+                call_oi=int(row['call_oi']),
+                put_oi=int(row['put_oi']),
+                pcr_volume=float(row['pcr_volume']),
+                pcr_oi=float(row['pcr_oi']),
+                signal_type=row['signal_type'],
+                calculated_at=calculated_at
+            ))
+            upsert_latest_pcr(session, row, calculated_at)
+
+            if row['signal_type'] == 'NEUTRAL':
+                continue
+
+            key = pcr_signal_key(row)
+            current = {'pcr_volume': float(row['pcr_volume'])}
+            if not should_emit(session, key, current):
+                metrics.SIGNALS_SUPPRESSED.inc(kind="PCR")
+                continue
+            remember_signal(session, key, row['ticker'], row['signal_type'], current)
+            metrics.SIGNALS_EMITTED.inc(kind="PCR")
+            sent += 1
+        
+            # Отправка PCR сигнала подписчикам
+            with profiler.span("broadcast"):
+                await dispatch_signal(session, "PCR", row.to_dict())
         
-        # ДОБАВИТЬ: Сохранение PCR сигналов
-        if not pcr_signals.empty:
-            session = SessionLocal()
-            for _, row in pcr_signals.iterrows():
-                pcr_record = PutCallRatio(
-                    ticker=row['ticker'],
-                    call_volume=int(row['call_volume']),
-                    put_volume=int(row['put_volume']),
-                    call_oi=int(row['call_oi']),
-                    put_oi=int(row['put_oi']),
-                    pcr_volume=float(row['pcr_volume']),
-                    pcr_oi=float(row['pcr_oi']),
-                    signal_type=row['signal_type']
-                )
-                session.add(pcr_record)
-                
-                # Отправка PCR сигнала подписчикам
-                await send_pcr_signal_to_subscribers(row)
-                
-            session.commit()
-            session.close()
-            logger.info(f"PCR signals for {t.symbol} saved and sent.")
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    logger.info(f"PCR saved for {len(pcr_df)} tickers, signals sent: {sent}")
 
 async def start_scheduler():
     """Асинхронный планировщик для регулярного обновления данных"""
@@ -101,7 +223,12 @@ async def start_scheduler():
     while True:
         start_time = datetime.now(timezone.utc)
         logger.info(f"Обновление данных: {start_time}")
-        await update_options_data()
+        with profiler.trace_cycle():
+            await update_options_data()
         elapsed = (datetime.now(timezone.utc) - start_time).total_seconds()
+        metrics.CYCLE_SECONDS.observe(elapsed)
+        metrics.LAST_CYCLE_SECONDS.set(elapsed)
+        if elapsed > UPDATE_INTERVAL_MIN * 60 * 0.8:
+            logger.warning(f"Цикл занял {elapsed:.0f} с — близко к UPDATE_INTERVAL_MIN ({UPDATE_INTERVAL_MIN} мин)")
         sleep_time = max(UPDATE_INTERVAL_MIN * 60 - elapsed, 0)
         await asyncio.sleep(sleep_time)
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.db.models import SessionLocal, Ticker, WorkerLease, TickerClaim
+import config.config as config
+
+def _utcnow_naive() -> datetime:
+    # SQLite хранит datetime без timezone, поэтому сравниваем в naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def heartbeat(session, worker_id: str):
+    """Создаёт или продлевает lease-запись воркера"""
+    now = _utcnow_naive()
+    lease = session.query(WorkerLease).filter(WorkerLease.worker_id == worker_id).first()
+    if lease is None:
+        lease = WorkerLease(worker_id=worker_id, started_at=now)
+        session.add(lease)
+        logger.info(f"Worker {worker_id} joined")
+    lease.heartbeat_at = now
+    session.commit()
+
+def release(worker_id: str):
+    """Удаляет lease воркера при штатной остановке, чтобы шарды перераспределились сразу"""
+    session = SessionLocal()
+    try:
+        session.query(WorkerLease).filter(WorkerLease.worker_id == worker_id).delete()
+        session.commit()
+        logger.info(f"Worker {worker_id} released its lease")
+    finally:
+        session.close()
+
+def live_workers(session) -> list:
+    """Список живых воркеров (heartbeat не старше WORKER_LEASE_TTL_SEC)"""
+    cutoff = _utcnow_naive() - timedelta(seconds=config.WORKER_LEASE_TTL_SEC)
+    leases = session.query(WorkerLease).filter(WorkerLease.heartbeat_at >= cutoff).all()
+    return sorted(lease.worker_id for lease in leases)
+
+def owner_of(symbol: str, workers: list) -> str:
+    """
+    Rendezvous (HRW) hashing: тикер принадлежит воркеру с максимальным весом.
+    При уходе или появлении воркера переезжают только его тикеры.
+    """
+    if not workers:
+        return None
+    return max(workers, key=lambda w: hashlib.md5(f"{w}:{symbol}".encode()).hexdigest())
+
+def shard_tickers(session, worker_id: str) -> list:
+    """Тикеры из таблицы Ticker, которые обрабатывает данный воркер"""
+    workers = live_workers(session)
+    if worker_id not in workers:
+        workers = sorted(workers + [worker_id])
+    tickers = session.query(Ticker).all()
+    mine = [t for t in tickers if owner_of(t.symbol, workers) == worker_id]
+    logger.info(f"Worker {worker_id}: {len(mine)}/{len(tickers)} tickers, live workers: {len(workers)}")
+    return mine
+
+def owns_ticker(session, symbol: str, worker_id: str) -> bool:
+    """Повторная проверка владения перед обработкой: состав воркеров мог измениться посреди цикла"""
+    workers = live_workers(session)
+    if worker_id not in workers:
+        workers = sorted(workers + [worker_id])
+    return owner_of(symbol, workers) == worker_id
+
+def claim_ticker(session, symbol: str, worker_id: str) -> bool:
+    """
+    Атомарно берёт тикер в обработку. Чужой захват перехватывается, только если
+    он старше WORKER_LEASE_TTL_SEC (воркер упал, не освободив тикер).
+    """
+    now = _utcnow_naive()
+    stale = now - timedelta(seconds=config.WORKER_LEASE_TTL_SEC)
+    stmt = sqlite_insert(TickerClaim).values(symbol=symbol, worker_id=worker_id, claimed_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TickerClaim.symbol],
+        set_={'worker_id': worker_id, 'claimed_at': now},
+        where=(TickerClaim.worker_id == worker_id) | (TickerClaim.claimed_at < stale)
+    )
+    claimed = session.execute(stmt).rowcount == 1
+    session.commit()
+    return claimed
+
+def acquire_ticker(symbol: str, worker_id: str) -> bool:
+    """Тикер обрабатывается, только если воркер всё ещё его владелец и тикер не занят другим воркером"""
+    session = SessionLocal()
+    try:
+        if not owns_ticker(session, symbol, worker_id):
+            logger.info(f"Worker {worker_id}: {symbol} moved to another worker, skipping")
+            return False
+        if not claim_ticker(session, symbol, worker_id):
+            logger.info(f"Worker {worker_id}: {symbol} is being processed by another worker, skipping")
+            return False
+        return True
+    finally:
+        session.close()
+
+def release_ticker(symbol: str, worker_id: str):
+    session = SessionLocal()
+    try:
+        session.query(TickerClaim).filter(TickerClaim.symbol == symbol, TickerClaim.worker_id == worker_id).delete()
+        session.commit()
+    finally:
+        session.close()
+
+async def start_heartbeat(worker_id: str):
+    """Фоновое продление lease, пока воркер жив"""
+    while True:
+        session = SessionLocal()
+        try:
+            heartbeat(session, worker_id)
+        except Exception as e:
+            logger.error(f"Heartbeat failed for {worker_id}: {e}")
+        finally:
+            session.close()
+        await asyncio.sleep(config.WORKER_HEARTBEAT_SEC)
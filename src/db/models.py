@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, Index
 from sqlalchemy.orm import declarative_base, sessionmaker
 from datetime import datetime, timezone
 
@@ -15,7 +15,7 @@ class Ticker(Base):
     __tablename__ = "tickers"
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, unique=True, index=True)
-    added_at = Column(DateTime, default=datetime.now(timezone.utc))
+    added_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 # Таблица для данных по опционам
 class OptionData(Base):
@@ -32,7 +32,7 @@ class OptionData(Base):
     volume = Column(Integer)
     open_interest = Column(Integer)
     underlying_price = Column(Float)
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 # Таблица для логов сигналов
 class SignalLog(Base):
@@ -45,7 +45,7 @@ class SignalLog(Base):
     volume_change = Column(Float)
     iv_change = Column(Float)
     oi_change = Column(Integer)
-    signal_time = Column(DateTime, default=datetime.now(timezone.utc))
+    signal_time = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     source = Column(String)
     
 # Добавить после SignalLog
@@ -60,15 +60,40 @@ class PutCallRatio(Base):
     pcr_volume = Column(Float)  # Put/Call Ratio по объёму
     pcr_oi = Column(Float)  # Put/Call Ratio по открытому интересу
     signal_type = Column(String)  # BULLISH / BEARISH / NEUTRAL
-    calculated_at = Column(DateTime, default=datetime.now(timezone.utc))   
+    calculated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))   
     
+# Read model: последний PCR по каждому тикеру (обновляется планировщиком при записи)
+class LatestPutCallRatio(Base):
+    __tablename__ = "latest_put_call_ratios"
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, unique=True, index=True)
+    call_volume = Column(Integer)
+    put_volume = Column(Integer)
+    call_oi = Column(Integer)
+    put_oi = Column(Integer)
+    pcr_volume = Column(Float)
+    pcr_oi = Column(Float)
+    signal_type = Column(String)
+    calculated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+# Инкрементальная статистика PCR по тикеру (экспоненциально взвешенные среднее и дисперсия)
+class PcrStats(Base):
+    __tablename__ = "pcr_stats"
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, unique=True, index=True)
+    count = Column(Integer, default=0)
+    mean = Column(Float, default=0.0)
+    variance = Column(Float, default=0.0)
+    last_zscore = Column(Float, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 # Добавить новую таблицу после SignalLog
 class Settings(Base):
     __tablename__ = "settings"
     id = Column(Integer, primary_key=True, index=True)
     key = Column(String, unique=True, index=True)
     value = Column(Float)
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
 # Добавить после таблицы Settings
 class Subscriber(Base):
@@ -77,7 +102,7 @@ class Subscriber(Base):
     user_id = Column(Integer, unique=True, index=True)  # Telegram user ID
     username = Column(String, nullable=True)
     subscribed = Column(Boolean, default=True)
-    subscribed_at = Column(DateTime, default=datetime.now(timezone.utc))
+    subscribed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
 class OptionSnapshot(Base):
     __tablename__ = "option_snapshots"
@@ -90,9 +115,55 @@ class OptionSnapshot(Base):
     open_interest = Column(Integer)
     implied_volatility = Column(Float)
     last_price = Column(Float)
-    snapshot_time = Column(DateTime, default=datetime.now(timezone.utc), index=True)
+    snapshot_time = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    # Последний снимок тикера (/chart) — поиск по индексу, без скана всей истории
+    __table_args__ = (Index("ix_option_snapshots_ticker_time", "ticker", "snapshot_time"),)
+
+# Индекс дедупликации сигналов: последнее отправленное состояние по контракту и типу сигнала
+class SignalState(Base):
+    __tablename__ = "signal_states"
+    id = Column(Integer, primary_key=True, index=True)
+    signal_key = Column(String, unique=True, index=True)  # TICKER|TYPE|STRIKE|EXP|KIND
+    ticker = Column(String, index=True)
+    signal_type = Column(String)  # OPTION / BEARISH / BULLISH
+    volume = Column(Float)
+    implied_volatility = Column(Float)
+    open_interest = Column(Float)
+    pcr_volume = Column(Float)
+    last_sent_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+# Lease-записи воркеров для шардирования тикеров
+class WorkerLease(Base):
+    __tablename__ = "worker_leases"
+    id = Column(Integer, primary_key=True, index=True)
+    worker_id = Column(String, unique=True, index=True)
+    started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    heartbeat_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+# Тикер, взятый воркером в обработку: два воркера не обрабатывают один тикер одновременно
+class TickerClaim(Base):
+    __tablename__ = "ticker_claims"
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, unique=True, index=True)
+    worker_id = Column(String)
+    claimed_at = Column(DateTime)
+
+# Очередь сигналов от воркеров к единственному notifier
+class SignalOutbox(Base):
+    __tablename__ = "signal_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)  # OPTION / PCR
+    payload = Column(Text)  # JSON
+    worker_id = Column(String)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(DateTime, nullable=True, index=True)
 
 # Функция для создания всех таблиц
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("✅ База данных и таблицы созданы")
@@ -0,0 +1,158 @@
+import time
+from collections import deque
+from datetime import datetime, timezone
+from math import ceil
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.db.models import SessionLocal, Ticker, SignalLog, PutCallRatio, LatestPutCallRatio
+import config.config as config
+
+# Кольцевой буфер последних сигналов (новые слева)
+_recent_signals = deque(maxlen=config.RECENT_SIGNALS_BUFFER)
+_recent_loaded = False
+
+# Кэш таблиц read models: name -> (loaded_at, rows)
+_cache = {}
+
+PCR_FIELDS = ['call_volume', 'put_volume', 'call_oi', 'put_oi', 'pcr_volume', 'pcr_oi', 'signal_type']
+
+def _cached(name: str, loader):
+    """Возвращает закэшированные строки, перечитывая их не чаще READ_MODEL_CACHE_TTL_SEC"""
+    entry = _cache.get(name)
+    if entry and time.monotonic() - entry[0] < config.READ_MODEL_CACHE_TTL_SEC:
+        return entry[1]
+    rows = loader()
+    _cache[name] = (time.monotonic(), rows)
+    return rows
+
+def invalidate(name: str):
+    _cache.pop(name, None)
+
+# === Последние сигналы ===
+
+def push_recent_signal(signal_data: dict):
+    """Добавляет отправленный сигнал в буфер (в том же виде, что и запись SignalLog)"""
+    source = signal_data.get('source')
+    if source is None:
+        from src.data.providers import get_provider
+        source = get_provider().name
+    _recent_signals.appendleft({
+        'ticker': signal_data['ticker'],
+        'option_type': signal_data['option_type'],
+        'strike': float(signal_data['strike']),
+        'expiration': str(signal_data.get('expiration', '')),
+        'volume_change': signal_data.get('volume', 0),
+        'iv_change': signal_data.get('implied_volatility', 0),
+        'oi_change': signal_data.get('oi_change', 0),
+        'signal_time': signal_data.get('signal_time') or datetime.now(timezone.utc),
+        'source': source
+    })
+
+def _recent_key(signal: dict) -> tuple:
+    """Ключ сигнала для сверки буфера с SignalLog (время — naive UTC, как в SQLite)"""
+    signal_time = signal['signal_time']
+    if signal_time is not None and signal_time.tzinfo is not None:
+        signal_time = signal_time.astimezone(timezone.utc).replace(tzinfo=None)
+    return (signal['ticker'], signal['option_type'], round(float(signal['strike']), 4), str(signal['expiration']), signal_time)
+
+def get_recent_signals() -> list:
+    """Последние сигналы; при первом обращении буфер прогревается из SignalLog"""
+    global _recent_loaded
+    if not _recent_loaded:
+        session = SessionLocal()
+        try:
+            rows = session.query(SignalLog).order_by(SignalLog.id.desc()).limit(config.RECENT_SIGNALS_BUFFER).all()
+            # Сигналы, пришедшие до прогрева, новее записей из БД
+            fresh = list(_recent_signals)
+            _recent_signals.clear()
+            for s in rows:
+                _recent_signals.append({
+                    'ticker': s.ticker,
+                    'option_type': s.option_type,
+                    'strike': s.strike,
+                    'expiration': s.expiration,
+                    'volume_change': s.volume_change,
+                    'iv_change': s.iv_change,
+                    'oi_change': s.oi_change,
+                    'signal_time': s.signal_time,
+                    'source': s.source
+                })
+            # Отправленный до прогрева сигнал мог уже попасть в SignalLog — не показываем его дважды
+            stored = {_recent_key(s) for s in _recent_signals}
+            _recent_signals.extendleft(reversed([s for s in fresh if _recent_key(s) not in stored]))
+        finally:
+            session.close()
+        _recent_loaded = True
+    return list(_recent_signals)
+
+# === Последний PCR по тикеру ===
+
+def upsert_latest_pcr(session, row, calculated_at: datetime = None):
+    """Обновляет read model последнего PCR по тикеру (commit делает вызывающий код)"""
+    values = {
+        'call_volume': int(row['call_volume']),
+        'put_volume': int(row['put_volume']),
+        'call_oi': int(row['call_oi']),
+        'put_oi': int(row['put_oi']),
+        'pcr_volume': float(row['pcr_volume']),
+        'pcr_oi': float(row['pcr_oi']),
+        'signal_type': row.get('signal_type', 'NEUTRAL'),
+        'calculated_at': calculated_at or datetime.now(timezone.utc)
+    }
+    # Upsert: строку тикера мог только что вставить backfill в процессе бота
+    stmt = sqlite_insert(LatestPutCallRatio).values(ticker=row['ticker'], **values)
+    session.execute(stmt.on_conflict_do_update(index_elements=[LatestPutCallRatio.ticker], set_=values))
+    invalidate('latest_pcr')
+
+def _backfill_latest_pcr(session):
+    """Однократно заполняет read model из истории PutCallRatio"""
+    last_ids = select(func.max(PutCallRatio.id)).group_by(PutCallRatio.ticker)
+    rows = session.query(PutCallRatio).filter(PutCallRatio.id.in_(last_ids)).all()
+    for pcr in rows:
+        # Воркер мог записать более свежее значение между проверкой и вставкой — его не трогаем
+        stmt = sqlite_insert(LatestPutCallRatio).values(
+            ticker=pcr.ticker,
+            calculated_at=pcr.calculated_at,
+            **{field: getattr(pcr, field) for field in PCR_FIELDS}
+        )
+        session.execute(stmt.on_conflict_do_nothing(index_elements=[LatestPutCallRatio.ticker]))
+    session.commit()
+    logger.info(f"Latest PCR read model backfilled for {len(rows)} tickers")
+
+def _load_latest_pcr() -> list:
+    session = SessionLocal()
+    try:
+        if session.query(LatestPutCallRatio.id).first() is None:
+            _backfill_latest_pcr(session)
+        rows = session.query(LatestPutCallRatio).order_by(LatestPutCallRatio.ticker).all()
+        return [
+            {'ticker': r.ticker, 'calculated_at': r.calculated_at, **{field: getattr(r, field) for field in PCR_FIELDS}}
+            for r in rows
+        ]
+    finally:
+        session.close()
+
+def get_latest_pcr() -> list:
+    return _cached('latest_pcr', _load_latest_pcr)
+
+# === Watchlist ===
+
+def _load_watchlist() -> list:
+    session = SessionLocal()
+    try:
+        return [symbol for (symbol,) in session.query(Ticker.symbol).order_by(Ticker.symbol).all()]
+    finally:
+        session.close()
+
+def get_watchlist() -> list:
+    return _cached('watchlist', _load_watchlist)
+
+# === Пагинация ===
+
+def paginate(items: list, page: int, page_size: int = None):
+    """Возвращает (элементы страницы, номер страницы, всего страниц)"""
+    page_size = page_size or config.READ_MODEL_PAGE_SIZE
+    pages = max(ceil(len(items) / page_size), 1)
+    page = min(max(page, 0), pages - 1)
+    return items[page * page_size:(page + 1) * page_size], page, pages
@@ -0,0 +1,159 @@
+import threading
+import time
+from contextlib import contextmanager
+from loguru import logger
+import config.config as config
+
+# Границы бакетов гистограмм в секундах (от быстрых запросов к БД до длинных циклов)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in self._values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [counts по бакетам, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замер длительности блока кода"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    result.append((f"{self.name}_bucket", key, {'le': repr(float(bound))}, bucket_count))
+                result.append((f"{self.name}_bucket", key, {'le': '+Inf'}, count))
+                result.append((f"{self.name}_sum", key, None, total))
+                result.append((f"{self.name}_count", key, None, count))
+        return result
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            return self._metrics[metric.name]
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus exposition 0.0.4"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, key, extra, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+# === Метрики пайплайна ===
+FETCH_SECONDS = REGISTRY.histogram("options_fetch_seconds", "Время получения цепочки опционов по тикеру")
+FETCH_FAILURES = REGISTRY.counter("options_fetch_failures_total", "Тикеры, для которых не удалось получить цепочку")
+SAVE_SECONDS = REGISTRY.histogram("options_save_to_db_seconds", "Длительность save_to_db")
+CHANGES_SECONDS = REGISTRY.histogram("options_calculate_changes_seconds", "Длительность calculate_changes")
+ROWS_WRITTEN = REGISTRY.counter("options_rows_written_total", "Записано строк опционов (данные + снимки)")
+SIGNALS_EMITTED = REGISTRY.counter("options_signals_emitted_total", "Сигналов сохранено и отправлено в рассылку")
+SIGNALS_SUPPRESSED = REGISTRY.counter("options_signals_suppressed_total", "Сигналов подавлено cooldown")
+TELEGRAM_SEND_SECONDS = REGISTRY.histogram("telegram_send_seconds", "Длительность одного send_message")
+TELEGRAM_SEND_FAILURES = REGISTRY.counter("telegram_send_failures_total", "Ошибки отправки сообщений в Telegram")
+CHART_RENDER_SECONDS = REGISTRY.histogram("chart_render_seconds", "Отрисовка графика в пуле процессов (без попаданий в кэш)")
+CHART_REQUESTS = REGISTRY.counter("chart_requests_total", "Запросы графиков по результату кэша (hit/miss)")
+CYCLE_SECONDS = REGISTRY.histogram("scheduler_cycle_seconds", "Длительность цикла обновления")
+LAST_CYCLE_SECONDS = REGISTRY.gauge("scheduler_last_cycle_seconds", "Длительность последнего цикла обновления")
+UPDATE_INTERVAL_SECONDS = REGISTRY.gauge("scheduler_update_interval_seconds", "Интервал обновления UPDATE_INTERVAL_MIN в секундах")
+
+UPDATE_INTERVAL_SECONDS.set(config.UPDATE_INTERVAL_MIN * 60)
+
+# === HTTP endpoint ===
+async def start_metrics_server():
+    """Отдаёт метрики в формате Prometheus на METRICS_HOST:METRICS_PORT/metrics"""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=REGISTRY.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get(config.METRICS_PATH, handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.METRICS_HOST, config.METRICS_PORT)
+    try:
+        await site.start()
+    except OSError as e:
+        # Порт занят другим процессом — работаем без endpoint, а не падаем при старте
+        logger.error(f"Metrics endpoint disabled, cannot bind {config.METRICS_HOST}:{config.METRICS_PORT}: {e}")
+        await runner.cleanup()
+        return
+    logger.info(f"Metrics endpoint on {config.METRICS_HOST}:{config.METRICS_PORT}{config.METRICS_PATH}")
+    return runner
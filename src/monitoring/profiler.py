@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from loguru import logger
+import config.config as config
+
+class Span:
+    """Узел дерева трассировки: имя этапа, время начала/конца, вложенные этапы"""
+
+    def __init__(self, name: str, attrs: dict = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            'name': self.name,
+            'attrs': self.attrs,
+            'offset_ms': round((self.start - origin) * 1000, 2),
+            'duration_ms': round(self.duration * 1000, 2),
+            'children': [child.to_dict(origin) for child in self.children]
+        }
+
+class StackSampler(threading.Thread):
+    """
+    Сэмплирующий профайлер: раз в interval секунд снимает стек целевого потока.
+    Накладные расходы не зависят от числа вызовов функций, в отличие от cProfile.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="cycle-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> str:
+        """Формат collapsed stacks (flamegraph.pl, speedscope)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+class CycleTrace:
+    def __init__(self):
+        self.root = Span("cycle")
+        self._stack = [self.root]
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        node = Span(name, attrs)
+        self._stack[-1].children.append(node)
+        self._stack.append(node)
+        try:
+            yield node
+        finally:
+            node.end = time.perf_counter()
+            self._stack.pop()
+
+    def to_dict(self) -> dict:
+        return self.root.to_dict(self.root.start)
+
+_current_trace = None
+
+@contextmanager
+def span(name: str, **attrs):
+    """Этап цикла; без активной трассировки ничего не делает"""
+    if _current_trace is None:
+        yield None
+        return
+    with _current_trace.span(name, **attrs) as node:
+        yield node
+
+@contextmanager
+def trace_cycle():
+    """Оборачивает цикл планировщика: дерево этапов + сэмплы стека; медленные циклы сохраняются на диск"""
+    global _current_trace
+    if not config.PROFILE_CYCLES:
+        yield None
+        return
+
+    trace = CycleTrace()
+    sampler = StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL_SEC)
+    _current_trace = trace
+    sampler.start()
+    try:
+        yield trace
+    finally:
+        trace.root.end = time.perf_counter()
+        sampler.stop()
+        _current_trace = None
+        if trace.root.duration >= config.PROFILE_SLOW_CYCLE_SEC:
+            save_slow_cycle(trace, sampler)
+
+def _prune_profiles(directory: str, keep: int):
+    files = sorted(f for f in os.listdir(directory) if f.startswith("cycle-"))
+    stamps = sorted({f.split(".")[0] for f in files})
+    for stamp in stamps[:-keep]:
+        for f in files:
+            if f.startswith(stamp):
+                os.remove(os.path.join(directory, f))
+
+def save_slow_cycle(trace: CycleTrace, sampler: StackSampler):
+    """Сохраняет дерево этапов (JSON) и профиль (collapsed stacks) медленного цикла"""
+    try:
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("cycle-%Y%m%dT%H%M%S")
+        base = os.path.join(config.PROFILE_DIR, stamp)
+
+        with open(f"{base}.spans.json", "w", encoding="utf-8") as f:
+            json.dump(trace.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        with open(f"{base}.folded", "w", encoding="utf-8") as f:
+            f.write(sampler.folded())
+
+        _prune_profiles(config.PROFILE_DIR, config.PROFILE_KEEP)
+        logger.warning(f"Медленный цикл {trace.root.duration:.1f} с — профиль сохранён в {base}.*")
+    except Exception as e:
+        logger.error(f"Не удалось сохранить профиль цикла: {e}")
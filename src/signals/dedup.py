@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.db.models import SignalState
+import config.config as config
+
+# Индекс последних отправленных сигналов: signal_key -> состояние.
+# Держится в памяти и дублируется в таблицу signal_states, чтобы переживать рестарты.
+_signal_index = {}
+_index_loaded = False
+
+def option_signal_key(row) -> str:
+    """Ключ сигнала по контракту: тикер, тип, страйк, экспирация"""
+    return f"{row['ticker']}|{row['option_type']}|{float(row['strike']):.4f}|{row.get('expiration', '')}|OPTION"
+
+def pcr_signal_key(row) -> str:
+    """Ключ PCR сигнала: тикер и направление (BEARISH / BULLISH)"""
+    return f"{row['ticker']}|PCR|{row['signal_type']}"
+
+def _as_utc(dt: datetime) -> datetime:
+    """SQLite возвращает naive datetime — считаем его UTC"""
+    if dt is None:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def _state_to_dict(state: SignalState) -> dict:
+    return {
+        'volume': state.volume,
+        'implied_volatility': state.implied_volatility,
+        'open_interest': state.open_interest,
+        'pcr_volume': state.pcr_volume,
+        'last_sent_at': _as_utc(state.last_sent_at)
+    }
+
+def load_signal_index(session, force=False):
+    """Загружает индекс из БД в память (один раз за процесс)"""
+    global _index_loaded
+    if _index_loaded and not force:
+        return
+
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=config.SIGNAL_COOLDOWN_MIN)
+    _signal_index.clear()
+    for state in session.query(SignalState).filter(SignalState.last_sent_at >= cutoff.replace(tzinfo=None)).all():
+        _signal_index[state.signal_key] = _state_to_dict(state)
+
+    _index_loaded = True
+    logger.info(f"Signal dedup index loaded: {len(_signal_index)} active keys")
+
+def _relative_change(prev, current) -> float:
+    if not prev:
+        return float('inf') if current else 0.0
+    return abs(current - prev) / abs(prev)
+
+def is_material_change(prev: dict, current: dict) -> bool:
+    """Проверяет, изменился ли сигнал существенно относительно последнего отправленного"""
+    if current.get('volume') is not None and prev.get('volume') is not None:
+        # Только прирост, и относительный порог, и абсолютный: на малых объёмах 1→2 — это не +100%
+        increase = current['volume'] - prev['volume']
+        if increase >= max(config.SIGNAL_MATERIAL_MIN_VOLUME_DELTA, prev['volume'] * config.SIGNAL_MATERIAL_VOLUME_CHANGE):
+            return True
+
+    if current.get('implied_volatility') is not None and prev.get('implied_volatility') is not None:
+        if abs(current['implied_volatility'] - prev['implied_volatility']) >= config.SIGNAL_MATERIAL_IV_CHANGE:
+            return True
+
+    if current.get('pcr_volume') is not None and prev.get('pcr_volume') is not None:
+        if _relative_change(prev['pcr_volume'], current['pcr_volume']) >= config.SIGNAL_MATERIAL_PCR_CHANGE:
+            return True
+
+    return False
+
+def prune_signal_index(session, now: datetime = None) -> int:
+    """
+    Удаляет состояния старше SIGNAL_COOLDOWN_MIN из памяти и из signal_states:
+    после cooldown сигнал всё равно отправляется, хранить их незачем (commit делает вызывающий код)
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(minutes=config.SIGNAL_COOLDOWN_MIN)
+    expired = [key for key, state in _signal_index.items() if state['last_sent_at'] < cutoff]
+    for key in expired:
+        del _signal_index[key]
+    deleted = session.query(SignalState).filter(SignalState.last_sent_at < cutoff.replace(tzinfo=None)).delete()
+    if expired or deleted:
+        logger.info(f"Signal dedup index pruned: {len(expired)} keys in memory, {deleted} rows")
+    return deleted
+
+def should_emit(session, key: str, current: dict, now: datetime = None) -> bool:
+    """
+    Решает, нужно ли сохранять и рассылать сигнал.
+    Сигнал пропускается, если по тому же ключу уже был сигнал в пределах cooldown
+    и значения с тех пор существенно не изменились.
+    """
+    load_signal_index(session)
+    now = now or datetime.now(timezone.utc)
+
+    prev = _signal_index.get(key)
+    if prev is None:
+        return True
+
+    if now - prev['last_sent_at'] >= timedelta(minutes=config.SIGNAL_COOLDOWN_MIN):
+        return True
+
+    if is_material_change(prev, current):
+        return True
+
+    logger.debug(f"Signal suppressed by cooldown: {key}")
+    return False
+
+def remember_signal(session, key: str, ticker: str, signal_type: str, current: dict, now: datetime = None):
+    """Запоминает отправленный сигнал в памяти и в БД (commit делает вызывающий код)"""
+    now = now or datetime.now(timezone.utc)
+
+    values = {
+        'ticker': ticker,
+        'signal_type': signal_type,
+        'volume': current.get('volume'),
+        'implied_volatility': current.get('implied_volatility'),
+        'open_interest': current.get('open_interest'),
+        'pcr_volume': current.get('pcr_volume'),
+        'last_sent_at': now
+    }
+    # Upsert: тот же ключ мог записать другой воркер (перебалансировка шардов)
+    stmt = sqlite_insert(SignalState).values(signal_key=key, **values)
+    session.execute(stmt.on_conflict_do_update(index_elements=[SignalState.signal_key], set_=values))
+
+    _signal_index[key] = {
+        'volume': values['volume'],
+        'implied_volatility': values['implied_volatility'],
+        'open_interest': values['open_interest'],
+        'pcr_volume': values['pcr_volume'],
+        'last_sent_at': _as_utc(now)
+    }
@@ -1,18 +1,20 @@
+import time
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 from loguru import logger
 from src.db.models import Settings
-from src.db.models import SessionLocal, Settings, OptionSnapshot
+from src.db.models import SessionLocal, Settings, OptionSnapshot, PcrStats
+from src.monitoring import metrics
 import config.config as config
 
-logger.add("logs/signals.log", rotation="1 MB", retention="7 days", level="INFO")
-
 def calculate_changes(df: pd.DataFrame):
     """Рассчитывает изменения volume, OI и IV относительно предыдущего снимка"""
     if df.empty:
         return df
     
     session = SessionLocal()
+    started = time.perf_counter()
     
     # Инициализируем колонки изменений нулями
     df['volume_change'] = 0.0
@@ -46,6 +48,7 @@ def calculate_changes(df: pd.DataFrame):
                 )
     
     session.close()
+    metrics.CHANGES_SECONDS.observe(time.perf_counter() - started)
     logger.info(f"Calculated changes for {len(df)} options")
     return df
 
@@ -58,7 +61,7 @@ def detect_volume_spike(df: pd.DataFrame, k: float = 3.0):
     if df.empty or 'volume' not in df.columns:
         return pd.DataFrame()
 
-    df['avg_volume'] = df.groupby('ticker')['volume'].transform('mean')
+    df['avg_volume'] = df.groupby('ticker', observed=True)['volume'].transform('mean')
     df['volume_spike'] = df['volume'] > k * df['avg_volume']
     spikes = df[df['volume_spike']]
     logger.info(f"Volume spikes detected: {len(spikes)}")
@@ -73,7 +76,7 @@ def detect_iv_increase(df: pd.DataFrame, threshold: float = 0.1):
     if df.empty or 'implied_volatility' not in df.columns:
         return pd.DataFrame()
 
-    df['avg_iv'] = df.groupby('ticker')['implied_volatility'].transform('mean')
+    df['avg_iv'] = df.groupby('ticker', observed=True)['implied_volatility'].transform('mean')
     df['iv_increase'] = df['implied_volatility'] > (1 + threshold) * df['avg_iv']
     iv_alerts = df[df['iv_increase']]
     logger.info(f"IV increases detected: {len(iv_alerts)}")
@@ -86,7 +89,7 @@ def filter_by_expiration(df: pd.DataFrame, days: int = 7):
 
     # Используем timezone-naive datetime для совместимости с pandas
     today = datetime.now()
-    df['expiration_date'] = pd.to_datetime(df['expiration'], errors='coerce')
+    df['expiration_date'] = pd.to_datetime(df['expiration'].astype(str), errors='coerce')
     
     # Убираем timezone из expiration_date, если она есть
     if df['expiration_date'].dt.tz is not None:
@@ -106,7 +109,7 @@ def set_setting(session, key: str, value: float):
     setting = session.query(Settings).filter(Settings.key == key).first()
     if setting:
         setting.value = value
-        setting.updated_at = datetime.now(timezone.utc)()
+        setting.updated_at = datetime.now(timezone.utc)
     else:
         setting = Settings(key=key, value=value)
         session.add(setting)
@@ -114,79 +117,121 @@ def set_setting(session, key: str, value: float):
     
 def calculate_put_call_ratio(df: pd.DataFrame):
     """
-    Рассчитывает Put/Call Ratio по объёму и открытому интересу
+    Рассчитывает Put/Call Ratio по объёму и открытому интересу для всех тикеров одним pivot
     Высокий PCR (>1.0) = медвежий сигнал
     Низкий PCR (<0.7) = бычий сигнал
     """
     if df.empty:
         return pd.DataFrame()
     
-    grouped = df.groupby(['ticker', 'option_type']).agg({
-        'volume': 'sum',
-        'open_interest': 'sum'
-    }).reset_index()
+    pivot = df.pivot_table(
+        index='ticker',
+        columns='option_type',
+        values=['volume', 'open_interest'],
+        aggfunc='sum',
+        fill_value=0,
+        observed=True
+    )
+    # Гарантируем наличие CALL и PUT, даже если у тикера нет одной из сторон
+    pivot = pivot.reindex(
+        columns=pd.MultiIndex.from_product([['volume', 'open_interest'], ['CALL', 'PUT']]),
+        fill_value=0
+    )
     
-    results = []
+    call_volume = pivot[('volume', 'CALL')].astype('int64')
+    put_volume = pivot[('volume', 'PUT')].astype('int64')
+    call_oi = pivot[('open_interest', 'CALL')].astype('int64')
+    put_oi = pivot[('open_interest', 'PUT')].astype('int64')
     
-    for ticker in grouped['ticker'].unique():
-        ticker_data = grouped[grouped['ticker'] == ticker]
-        
-        call_data = ticker_data[ticker_data['option_type'] == 'CALL']
-        put_data = ticker_data[ticker_data['option_type'] == 'PUT']
-        
-        call_volume = call_data['volume'].sum() if not call_data.empty else 0
-        put_volume = put_data['volume'].sum() if not put_data.empty else 0
-        
-        call_oi = call_data['open_interest'].sum() if not call_data.empty else 0
-        put_oi = put_data['open_interest'].sum() if not put_data.empty else 0
-        
-        # Расчёт Put/Call Ratio
-        pcr_volume = put_volume / call_volume if call_volume > 0 else 0
-        pcr_oi = put_oi / call_oi if call_oi > 0 else 0
-        
-        results.append({
-            'ticker': ticker,
-            'call_volume': call_volume,
-            'put_volume': put_volume,
-            'call_oi': call_oi,
-            'put_oi': put_oi,
-            'pcr_volume': pcr_volume,
-            'pcr_oi': pcr_oi,
-            'total_volume': call_volume + put_volume,
-            'total_oi': call_oi + put_oi
-        })
-    
-    pcr_df = pd.DataFrame(results)
+    pcr_df = pd.DataFrame({
+        'ticker': pivot.index.astype(str),
+        'call_volume': call_volume.to_numpy(),
+        'put_volume': put_volume.to_numpy(),
+        'call_oi': call_oi.to_numpy(),
+        'put_oi': put_oi.to_numpy(),
+        # Расчёт Put/Call Ratio (0, если по коллам нет объёма)
+        'pcr_volume': (put_volume / call_volume.where(call_volume > 0)).fillna(0).to_numpy(),
+        'pcr_oi': (put_oi / call_oi.where(call_oi > 0)).fillna(0).to_numpy(),
+        'total_volume': (call_volume + put_volume).to_numpy(),
+        'total_oi': (call_oi + put_oi).to_numpy()
+    })
     logger.info(f"Put/Call ratios calculated for {len(pcr_df)} tickers")
     return pcr_df
 
-def detect_unusual_pcr(pcr_df: pd.DataFrame, bearish_threshold=1.5, bullish_threshold=0.5):
+def classify_pcr_fixed(pcr: pd.Series, bearish_threshold: float, bullish_threshold: float) -> pd.Series:
+    """Фиксированные пороги: PCR выше bearish = BEARISH, ниже bullish = BULLISH"""
+    return pd.Series(
+        np.select([pcr > bearish_threshold, pcr < bullish_threshold], ['BEARISH', 'BULLISH'], 'NEUTRAL'),
+        index=pcr.index
+    )
+
+def score_pcr(pcr_df: pd.DataFrame, bearish_threshold=None, bullish_threshold=None):
     """
-    Выявляет необычные значения Put/Call Ratio
-    bearish_threshold: PCR выше этого значения = сильный медвежий сигнал
-    bullish_threshold: PCR ниже этого значения = сильный бычий сигнал
+    Размечает PCR всех тикеров: signal_type (BEARISH / BULLISH / NEUTRAL) и pcr_zscore.
+    z-score считается относительно экспоненциально взвешенных среднего и дисперсии
+    собственной истории тикера (таблица pcr_stats), статистика обновляется инкрементально.
+    Пока истории меньше PCR_MIN_HISTORY наблюдений, действуют фиксированные пороги.
     """
     if pcr_df.empty:
         return pd.DataFrame()
     
-    unusual = pcr_df[
-        (pcr_df['pcr_volume'] > bearish_threshold) | 
-        (pcr_df['pcr_volume'] < bullish_threshold)
-    ].copy()
+    bearish_threshold = bearish_threshold or config.PCR_BEARISH_THRESHOLD
+    bullish_threshold = bullish_threshold or config.PCR_BULLISH_THRESHOLD
+    alpha = config.PCR_EWMA_ALPHA
     
-    # Определение типа сигнала
-    unusual['signal_type'] = unusual['pcr_volume'].apply(
-        lambda x: 'BEARISH' if x > bearish_threshold else 'BULLISH'
-    )
+    session = SessionLocal()
+    try:
+        stats = {
+            s.ticker: s for s in
+            session.query(PcrStats).filter(PcrStats.ticker.in_(pcr_df['ticker'].tolist())).all()
+        }
+        
+        count = pcr_df['ticker'].map(lambda t: stats[t].count if t in stats else 0).astype('int64')
+        mean = pcr_df['ticker'].map(lambda t: stats[t].mean if t in stats else 0.0).astype('float64')
+        variance = pcr_df['ticker'].map(lambda t: stats[t].variance if t in stats else 0.0).astype('float64')
+        
+        # z-score против статистики до текущего наблюдения
+        std = np.sqrt(variance)
+        zscore = ((pcr_df['pcr_volume'] - mean) / std.where(std > 0)).where(count >= config.PCR_MIN_HISTORY)
+        
+        adaptive = pd.Series(
+            np.select([zscore >= config.PCR_ZSCORE_THRESHOLD, zscore <= -config.PCR_ZSCORE_THRESHOLD], ['BEARISH', 'BULLISH'], 'NEUTRAL'),
+            index=pcr_df.index
+        )
+        fixed = classify_pcr_fixed(pcr_df['pcr_volume'], bearish_threshold, bullish_threshold)
+        
+        scored = pcr_df.copy()
+        scored['pcr_zscore'] = zscore
+        scored['signal_type'] = adaptive.where(count >= config.PCR_MIN_HISTORY, fixed)
+        
+        # Инкрементальное обновление EWMA: mean += a*d; var = (1-a)*(var + d*a*d)
+        diff = pcr_df['pcr_volume'] - mean
+        new_mean = np.where(count > 0, mean + alpha * diff, pcr_df['pcr_volume'])
+        new_variance = np.where(count > 0, (1 - alpha) * (variance + diff * alpha * diff), 0.0)
+        
+        now = datetime.now(timezone.utc)
+        for i, ticker in enumerate(pcr_df['ticker']):
+            state = stats.get(ticker)
+            if state is None:
+                state = PcrStats(ticker=ticker)
+                session.add(state)
+            state.count = int(count.iloc[i]) + 1
+            state.mean = float(new_mean[i])
+            state.variance = float(new_variance[i])
+            state.last_zscore = None if pd.isna(zscore.iloc[i]) else float(zscore.iloc[i])
+            state.updated_at = now
+        session.commit()
+    finally:
+        session.close()
     
-    logger.info(f"Unusual PCR detected: {len(unusual)} signals")
-    return unusual
+    logger.info(f"PCR scored for {len(scored)} tickers, unusual: {(scored['signal_type'] != 'NEUTRAL').sum()}")
+    return scored
 
 def generate_signals(df: pd.DataFrame, volume_k=None, iv_threshold=None, exp_days=None):
     """Основная функция: объединяет все фильтры и возвращает итоговые сигналы"""
     if df.empty:
         logger.info("No data to generate signals")
-        return pd.DataFrame(), pd.DataFrame()
+        return pd.DataFrame()
     
     # Загрузка настроек из config или параметров
     volume_k = volume_k or config.DEFAULT_VOLUME_SPIKE_K
@@ -202,9 +247,12 @@ def generate_signals(df: pd.DataFrame, volume_k=None, iv_threshold=None, exp_day
     combined = pd.concat([volume_spikes, iv_alerts]).drop_duplicates()
     final_signals = filter_by_expiration(combined, days=exp_days)
     
-    # Новые сигналы Put/Call Ratio
-    pcr_data = calculate_put_call_ratio(df)
-    pcr_signals = detect_unusual_pcr(pcr_data)
-    
-    logger.info(f"Total option signals: {len(final_signals)}, PCR signals: {len(pcr_signals)}")
-    return final_signals, pcr_signals
\ No newline at end of file
+    logger.info(f"Total option signals: {len(final_signals)}")
+    return final_signals
+
+def generate_pcr_signals(df: pd.DataFrame):
+    """
+    Put/Call Ratio по всем тикерам цикла (размеченный signal_type, NEUTRAL тоже сохраняется).
+    Вызывается один раз на цикл: один pivot и одно обновление pcr_stats на все тикеры
+    """
+    return score_pcr(calculate_put_call_ratio(df))
@@ -0,0 +1,71 @@
+"""
+Проверка времени импорта точек входа.
+
+    python -m src.tools.import_budget [--runs 3] [module ...]
+
+Каждый модуль импортируется в отдельном процессе с -X importtime; берётся лучший
+из нескольких запусков. Код выхода 1, если хотя бы один модуль превысил бюджет
+из config.IMPORT_TIME_BUDGET_MS.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import config.config as config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def measure_import(module: str):
+    """Возвращает (cumulative мкс для модуля, [(мкс, пакет)] самых тяжёлых прямых зависимостей)"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, os.path.join(ROOT, "src"), env.get("PYTHONPATH", "")])
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    # Строки идут снизу вверх: сначала вложенные импорты, затем сам пакет; вложенность — отступ по 2 пробела
+    total = 0
+    heaviest = []
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name[1:].rstrip()
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        if depth == 1:
+            children.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name == module:
+                total = int(cumulative)
+                heaviest = sorted(children, reverse=True)[:5]
+            children = []
+    return total, heaviest
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget for entry points")
+    parser.add_argument("modules", nargs="*", help="модули (по умолчанию все из IMPORT_TIME_BUDGET_MS)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    modules = args.modules or list(config.IMPORT_TIME_BUDGET_MS)
+    over_budget = False
+    for module in modules:
+        best, heaviest = min(measure_import(module) for _ in range(args.runs))
+        budget = config.IMPORT_TIME_BUDGET_MS.get(module)
+        ms = best / 1000
+        status = "OK" if budget is None or ms <= budget else "OVER"
+        over_budget = over_budget or status == "OVER"
+        print(f"{status:4} {module:24} {ms:8.1f} ms (budget {budget if budget is not None else '-'} ms)")
+        for cumulative, name in heaviest:
+            print(f"       {cumulative / 1000:8.1f} ms  {name}")
+
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == "__main__":
+    main()
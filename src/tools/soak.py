@@ -0,0 +1,175 @@
+"""
+Нагрузочный / soak прогон без сети.
+
+    python -m src.tools.soak --tickers 200 --subscribers 500 --duration 600 --interval 1
+
+Поднимает полный пайплайн main.py (бот + scheduler) во временном каталоге:
+рыночные данные — SyntheticProvider, Telegram — локальный фейковый Bot API,
+который только считает сообщения. По окончании печатает пропускную способность,
+время цикла и рост RSS.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from loguru import logger
+import config.config as config
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+SOAK_BOT_TOKEN = "123456:SOAK-TEST-TOKEN"
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE / 1024 / 1024
+
+def metric_total(metric, suffix: str = "") -> float:
+    """Сумма значения метрики по всем меткам (для гистограмм — suffix _count / _sum)"""
+    return sum(value for name, _, _, value in metric.samples() if name == metric.name + suffix)
+
+class FakeTelegramAPI:
+    """Минимальный Bot API: getMe, getUpdates (пусто), send* (возвращает Message)"""
+
+    def __init__(self):
+        self.messages = 0
+        self.photo_uploads = 0
+        self.methods = {}
+        self._message_id = 0
+
+    async def handle(self, request):
+        from aiohttp import web
+
+        method = request.match_info["method"]
+        self.methods[method] = self.methods.get(method, 0) + 1
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Soak", "username": "soak_bot"}
+        elif method == "getUpdates":
+            await asyncio.sleep(1)
+            result = []
+        elif method.startswith("send"):
+            data = await request.post()
+            self.messages += 1
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 0)), "type": "private"},
+                "text": data.get("text", "")
+            }
+            if method == "sendPhoto":
+                # Загрузка файла приходит как attach://<поле>, повторная отправка — как file_id
+                self.photo_uploads += str(data.get("photo", "")).startswith("attach://")
+                result["photo"] = [{"file_id": f"soak-photo-{self._message_id}", "file_unique_id": f"u{self._message_id}", "width": 800, "height": 700}]
+                result["caption"] = data.get("caption", "")
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, port: int):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+def seed(tickers: int, subscribers: int):
+    from src.db.models import SessionLocal, Ticker, Subscriber, init_db
+
+    init_db()
+    session = SessionLocal()
+    session.add_all(Ticker(symbol=f"SYN{i:04d}") for i in range(tickers))
+    session.add_all(Subscriber(user_id=100000 + i, username=f"soak{i}") for i in range(subscribers))
+    session.commit()
+    session.close()
+
+async def sample_rss(samples: list, warm: list, every: float = 5):
+    """RSS каждые every секунд; warm — замеры после первого цикла, когда тяжёлые модули уже импортированы"""
+    from src.monitoring import metrics
+
+    while True:
+        value = rss_mb()
+        samples.append(value)
+        if metric_total(metrics.CYCLE_SECONDS, "_count"):
+            warm.append(value)
+        await asyncio.sleep(every)
+
+async def soak(args):
+    import main as entry
+    from src.data.providers import SyntheticProvider, set_provider
+    from src.monitoring import metrics
+
+    set_provider(SyntheticProvider(latency_ms=args.latency_ms, error_rate=args.error_rate))
+    api = FakeTelegramAPI()
+    runner = await api.start(args.api_port)
+
+    rss, warm = [rss_mb()], []
+    sampler = asyncio.create_task(sample_rss(rss, warm))
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(entry.main(), timeout=args.duration)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+        rss.append(rss_mb())
+        await runner.cleanup()
+
+    fetched = metric_total(metrics.FETCH_SECONDS, "_count")
+    cycles = metric_total(metrics.CYCLE_SECONDS, "_count")
+    cycle_sum = metric_total(metrics.CYCLE_SECONDS, "_sum")
+    rows = metric_total(metrics.ROWS_WRITTEN)
+
+    print(f"Длительность:         {elapsed:.0f} с")
+    print(f"Тикеров обработано:   {fetched:.0f} ({fetched / elapsed:.2f}/с), ошибок загрузки: {metric_total(metrics.FETCH_FAILURES):.0f}")
+    print(f"Строк записано:       {rows:.0f} ({rows / elapsed:.0f}/с)")
+    print(f"Сигналов:             {metric_total(metrics.SIGNALS_EMITTED):.0f} отправлено, {metric_total(metrics.SIGNALS_SUPPRESSED):.0f} подавлено")
+    print(f"Сообщений в Telegram: {api.messages} ({api.messages / elapsed:.1f}/с), загрузок графиков: {api.photo_uploads}")
+    if cycles:
+        print(f"Циклов завершено:     {cycles:.0f}, среднее время {cycle_sum / cycles:.1f} с (интервал {args.interval * 60:.0f} с)")
+    else:
+        print("Циклов завершено:     0 — первый цикл не уложился в duration")
+    print(f"RSS:                  {rss[0]:.0f} → {rss[-1]:.0f} MB (пик {max(rss):.0f} MB, рост {rss[-1] - rss[0]:+.0f} MB)")
+    if warm:
+        # Рост после прогрева, а не от старта: импорты pandas/aiogram в первом цикле дают ~+120 MB
+        print(f"RSS после прогрева:   {warm[0]:.0f} → {rss[-1]:.0f} MB (рост {rss[-1] - warm[0]:+.0f} MB)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test полного пайплайна на синтетических данных")
+    parser.add_argument("--tickers", type=int, default=100)
+    parser.add_argument("--subscribers", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=300, help="секунды")
+    parser.add_argument("--interval", type=float, default=1, help="UPDATE_INTERVAL_MIN, минуты")
+    parser.add_argument("--latency-ms", type=float, default=config.SYNTHETIC_LATENCY_MS)
+    parser.add_argument("--error-rate", type=float, default=config.SYNTHETIC_ERROR_RATE)
+    parser.add_argument("--rate-limit", type=float, default=0, help="RATE_LIMIT_DELAY, секунды")
+    parser.add_argument("--api-port", type=int, default=8089)
+    parser.add_argument("--workdir", help="каталог для базы и логов (по умолчанию временный)")
+    args = parser.parse_args()
+
+    # База и логи создаются относительно текущего каталога — уводим их от рабочей базы
+    workdir = args.workdir or tempfile.mkdtemp(prefix="options_bot_soak_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    logger.info(f"Soak workdir: {workdir}")
+
+    # Настройки подменяются до импорта scheduler/bot: часть из них читается при импорте
+    config.RUN_MODE = "standalone"
+    config.BOT_DELIVERY_MODE = "polling"
+    config.DATA_PROVIDER = "synthetic"
+    config.TELEGRAM_BOT_TOKEN = SOAK_BOT_TOKEN
+    config.TELEGRAM_API_URL = f"http://127.0.0.1:{args.api_port}"
+    config.UPDATE_INTERVAL_MIN = args.interval
+    config.RATE_LIMIT_DELAY = args.rate_limit
+    config.YFINANCE_RETRY_DELAY = 0.1
+    # Порт метрик может быть занят ботом, запущенным на этом же хосте; цифры берутся из REGISTRY напрямую
+    config.METRICS_ENABLED = False
+
+    seed(args.tickers, args.subscribers)
+    asyncio.run(soak(args))
+
+if __name__ == "__main__":
+    main()